@@ -1,4 +1,5 @@
 from dataclasses import dataclass, field
+from typing import Callable
 
 
 @dataclass
@@ -9,7 +10,9 @@ class Node(object):
         pass
 
     def accept(self, visitor, *args, **kwargs):
-        return visitor.visit(self, *args, **kwargs)
+        if args or kwargs:
+            return visitor.visit(self, *args, **kwargs)
+        return visitor.visit(self)
 
 
 # --------- TYPES ---------
@@ -28,6 +31,9 @@ class FloatNum(Node):
 @dataclass
 class Variable(Node):
     name: str
+    depth: int = -1
+    slot: int = -1
+    type: str | None = None
 
 
 @dataclass
@@ -39,6 +45,7 @@ class String(Node):
 class Ref(Node):
     variable: Variable
     indices: list[Node]
+    type: str | None = None
 
 
 @dataclass
@@ -56,6 +63,9 @@ class BinExpr(Node):
     left: Node
     right: Node
     dims: list[int] = field(default_factory=lambda: [])
+    type: str | None = None
+    operand_types: tuple[str, str] | None = None    # checked types of the operands, kept only when runs agree
+    operator: Callable | None = field(default=None, repr=False, compare=False)  # bound once by the Interpreter
 
 
 @dataclass
@@ -63,6 +73,17 @@ class UnaryExpr(Node):
     op: str
     value: Node
     dims: list[int] = field(default_factory=lambda: [])
+    type: str | None = None
+    operand_types: tuple[str] | None = None
+    operator: Callable | None = field(default=None, repr=False, compare=False)
+
+
+@dataclass
+class FusedExpr(Node):
+    operands: list[Node]
+    code: tuple             # postfix: operand indices and element-wise operators
+    dims: list[int] = field(default_factory=lambda: [])
+    type: str | None = 'vector'
 
 
 @dataclass
@@ -88,6 +109,8 @@ class Assignment(Node):
     instr: str
     ref: Ref | Variable
     value: BinExpr | String
+    operand_types: tuple[str, str] | None = None    # of the old and the new value of a compound assignment
+    operator: Callable | None = field(default=None, repr=False, compare=False)
 
 
 @dataclass
@@ -105,6 +128,8 @@ class IfElseInstr(Node):
     condition: Node
     then_block: Node
     else_block: Node | None = None
+    then_frame_size: int = 0
+    else_frame_size: int = 0
 
 
 @dataclass
@@ -117,12 +142,16 @@ class ForLoop(Node):
     variable: Variable
     var_range: Range
     block: Node
+    frame_size: int = 0
+    hoisted: list[int] = field(default_factory=lambda: [])
 
 
 @dataclass
 class WhileLoop(Node):
     condition: Node
     block: Node
+    frame_size: int = 0
+    hoisted: list[int] = field(default_factory=lambda: [])
 
 
 # ---------- OTHER ----------
@@ -132,9 +161,22 @@ class Program(Node):
     def __init__(self, lineno: int, instructions: list[Node]):
         super().__init__(lineno)
         self.instructions = instructions
+        self.frame_size = 0
 
     def add_instr(self, instr: Node):
-        self.instructions.insert(0, instr)
+        self.instructions.append(instr)
+
+
+@dataclass
+class Hoisted(Node):
+    value: Node
+    slot: int   # global frame slot caching the value, cleared when its loop starts
+
+
+@dataclass
+class VectorizedLoop(Node):
+    loops: list[ForLoop]    # the replaced nest, outermost first; only variables, ranges and frames are used
+    assignment: Assignment  # run once, with every loop variable holding the slice its range covers
 
 
 @dataclass
@@ -0,0 +1,122 @@
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import argparse
+import contextlib
+import glob
+import io
+import json
+import os
+import sys
+import time
+import interpreter
+from interpreter import use_backend
+from main import compile_source, execute
+from matrix import Matrix
+import script_cache
+
+
+def parse_args():
+    arg_parser = argparse.ArgumentParser(description="Run many matrix scripts in parallel worker processes")
+    arg_parser.add_argument("files", nargs="+",
+                            help="scripts to run, or glob patterns matching them (quote them, ** recurses)")
+    arg_parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1,
+                            help="number of worker processes (default: one per CPU)")
+    arg_parser.add_argument("--engine", choices=["tree", "closure", "vm", "cpython"], default="tree",
+                            help="execution engine: tree-walking interpreter, compiled closures, bytecode VM "
+                                 "or a Python module run by CPython")
+    arg_parser.add_argument("--backend", choices=["auto", "python", "numpy"],
+                            default=os.environ.get("MATRIX_BACKEND", "auto"),
+                            help="matrix backend, 'auto' uses NumPy when installed (env: MATRIX_BACKEND)")
+    arg_parser.add_argument("--no-cache", action="store_true",
+                            help="always scan, parse and check the scripts instead of using __mcache__")
+    arg_parser.add_argument("--no-optimize", action="store_true",
+                            help="run the checked ASTs as written")
+    arg_parser.add_argument("--summary", default="-", metavar="FILE",
+                            help="where to write the JSON summary (default: -, standard output)")
+    return arg_parser.parse_args()
+
+
+def expand(patterns: list[str]):
+    """Returns the files named or matched by patterns, each once, in order."""
+    files = {}
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern, recursive=True)) if glob.has_magic(pattern) else [pattern]
+        files.update(dict.fromkeys(matches))
+    return list(files)
+
+
+def warm(backend: str):
+    # runs once in every worker, which then keeps its imports, parser tables and backend for all of its scripts
+    use_backend(backend)
+    # the pool already runs one script per CPU, products are not split any further
+    interpreter.MATMUL_WORKERS = 1
+
+
+def run_source(text: str, engine: str, optimize: bool = True, filename: str | None = None):
+    """Checks and runs one script, returning its summary record.
+
+    The record holds the script's status ('ok', 'syntax error', 'type errors'
+    or 'runtime error'), the TypeChecker's errors, everything the script
+    printed, the value it exited with and the wall time it took. A filename
+    lets the checked AST go through the script cache.
+    """
+    start = time.perf_counter()
+    errors, exit_value, status = [], None, 'ok'
+    output = io.StringIO()
+
+    with contextlib.redirect_stdout(output):
+        ast = script_cache.load(filename, text, optimize) if filename else None
+        if ast is None:
+            ast, cacheable = compile_source(text, optimize, errors)
+            if cacheable and filename:
+                script_cache.store(filename, text, ast, optimize)
+
+        if errors:
+            status = 'type errors'
+        elif ast is None:
+            status = 'syntax error'
+        else:
+            try:
+                exit_value = execute(ast, engine)
+            except Exception as e:
+                status = 'runtime error'
+                errors.append(f'{e.__class__.__name__}: {e}')
+
+    return {
+        'status': status,
+        'errors': errors,
+        'output': output.getvalue(),
+        'exit_value': exit_value.tolist() if isinstance(exit_value, Matrix) else exit_value,
+        'time': time.perf_counter() - start,
+    }
+
+
+def run_file(filename: str, engine: str, optimize: bool = True, cache: bool = True):
+    try:
+        with open(filename, 'r') as file:
+            text = file.read()
+    except (OSError, UnicodeDecodeError) as e:
+        record = {'status': 'unreadable', 'errors': [str(e)], 'output': '', 'exit_value': None, 'time': 0.0}
+    else:
+        record = run_source(text, engine, optimize, filename if cache else None)
+    return {'file': filename, **record}
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    files = expand(args.files)
+    run = partial(run_file, engine=args.engine, optimize=not args.no_optimize, cache=not args.no_cache)
+
+    with ProcessPoolExecutor(max(1, args.jobs), initializer=warm, initargs=(args.backend,)) as pool:
+        records = list(pool.map(run, files, chunksize=max(1, len(files) // (8 * max(1, args.jobs)))))
+
+    if args.summary == '-':
+        json.dump(records, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.summary, 'w') as f:
+            json.dump(records, f, indent=2)
+
+    failed = sum(record['status'] != 'ok' for record in records)
+    print(f'{len(records) - failed} of {len(records)} scripts ok', file=sys.stderr)
+    sys.exit(1 if failed else 0)
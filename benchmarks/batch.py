@@ -0,0 +1,48 @@
+"""Runs many small scripts as one main.py process each and as one batch.py job.
+
+Usage: python benchmarks/batch.py [scripts] [jobs]   (default: 50 scripts, one job per CPU)
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCRIPT = """
+x = {i};
+A = ones(3, 3);
+for k = 0:20 {{ x += k; }}
+print x, A[1, 1];
+"""
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    jobs = sys.argv[2] if len(sys.argv) > 2 else str(os.cpu_count() or 1)
+
+    with tempfile.TemporaryDirectory() as directory:
+        files = []
+        for i in range(count):
+            files.append(os.path.join(directory, f'script{i}.m'))
+            with open(files[-1], 'w') as f:
+                f.write(SCRIPT.format(i=i))
+
+        start = time.perf_counter()
+        for filename in files:
+            subprocess.run([sys.executable, os.path.join(ROOT, 'main.py'), '--no-cache', filename],
+                           capture_output=True, check=True)
+        processes = time.perf_counter() - start
+
+        start = time.perf_counter()
+        subprocess.run([sys.executable, os.path.join(ROOT, 'batch.py'), '--no-cache', '--jobs', jobs,
+                        '--summary', os.path.join(directory, 'summary.json'), os.path.join(directory, '*.m')],
+                       capture_output=True, check=True)
+        batch = time.perf_counter() - start
+
+    print(f'{count} scripts: {processes:.2f}s as processes, {batch:.2f}s as a batch of {jobs} jobs')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""Times the lab5 programs on every engine (the transpiled module already
+imported), and loading their .mbc files against scanning, parsing, checking
+and optimizing their source.
+
+Usage: python benchmarks/bytecode.py [programs...]   (default: all, at the suite's middle size)
+"""
+import contextlib
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import compile_source
+from interpreter import Interpreter
+from closure_compiler import ClosureCompiler
+from vm import VM
+import bytecode
+import transpiler
+from suite import PROGRAMS
+
+ENGINES = {
+    'tree': lambda ast, code: ast.accept(Interpreter(), toplevel=True),
+    'closure': lambda ast, code: ClosureCompiler().run(ast),
+    'vm': lambda ast, code: VM().run(code),
+    'cpython': lambda ast, module: transpiler.run(module),
+}
+
+
+def measure(function):
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = function()
+    return time.perf_counter() - start, result
+
+
+def main():
+    for program in sys.argv[1:] or PROGRAMS:
+        template, sizes = PROGRAMS[program]
+        text = template.format(n=sizes[1])
+
+        front_end, (ast, _) = measure(lambda: compile_source(text))
+        code = bytecode.compile_program(ast)
+        buffer = io.BytesIO()
+        bytecode.dump(code, buffer)
+        loading, _ = measure(lambda: bytecode.load(io.BytesIO(buffer.getvalue())))
+
+        module = transpiler.load_source(transpiler.transpile(ast))
+        times = '  '.join(f'{engine} {measure(lambda: run(ast, module if engine == "cpython" else code))[0] * 1e3:8.2f} ms'
+                          for engine, run in ENGINES.items())
+        print(f'{program + "/" + str(sizes[1]):<16} {times}   source {front_end * 1e3:6.2f} ms, '
+              f'.mbc {loading * 1e3:5.3f} ms ({len(buffer.getvalue())} bytes)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""Times break/continue-heavy loops (primes.m-style code) on every engine.
+
+Usage: python benchmarks/control_flow.py [limit] [repeat]
+"""
+import contextlib
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scanner import Scanner
+from parser import Mparser
+from type_checker import TypeChecker
+from interpreter import Interpreter
+from closure_compiler import ClosureCompiler
+
+
+PRIMES = """
+count = 0;
+for n = 2:{limit} {{
+    p = 1;
+    for d = 2:n-1 {{
+        if (d * d > n) break;
+        nc = n;
+        while (nc > 0) nc -= d;
+        if (nc != 0) continue;
+        p = 0;
+        break;
+    }}
+    if (p == 1) count += 1;
+}}
+print count;
+"""
+
+SKIPS = """
+s = 0;
+for i = 1:{limit} {{
+    for j = 1:200 {{
+        if (j > 2) continue;
+        s += j;
+    }}
+}}
+print s;
+"""
+
+ENGINES = {
+    'tree': lambda ast: ast.accept(Interpreter(), toplevel=True),
+    'closure': lambda ast: ClosureCompiler().run(ast),
+}
+
+
+def compile_source(text):
+    ast = Mparser().parse(Scanner().tokenize(text))
+    checker = TypeChecker()
+    checker.visit(ast)
+    assert not checker.errors, checker.errors
+    return ast
+
+
+def measure(text, engine, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        ast = compile_source(text)
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            ENGINES[engine](ast)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    limit = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+    for name, template in [('primes', PRIMES), ('skips', SKIPS)]:
+        text = template.format(limit=limit)
+        for engine in ENGINES:
+            print(f'{name:8} {engine:8} {measure(text, engine, repeat):8.3f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""Runs every sample on the tree interpreter and on --engine=cpython and diffs their output.
+
+Each sample runs optimized and with --no-optimize. The cpython engine runs it
+three ways: compiled in memory (--no-cache), storing its module in
+__mcache__, and loading that cached module. The samples are copied to a
+temporary directory first, so nothing is cached next to the real ones. A
+generated script nested deeper than CPython compiles checks the fallback to
+the interpreter. Only stdout is compared: tracebacks name different frames.
+
+Usage: python benchmarks/cpython_differential.py [files...]   (default: every sample)
+"""
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLES = os.path.join(ROOT, 'samples')
+
+# 30 nested loops of one iteration, past CPython's limit of 20 statically nested blocks
+DEEP = 'x = 0;\n' + ''.join(f'for i{i} = 0:0 {{\n' for i in range(30)) + 'x += 1;\n' + '}\n' * 30 + 'print x;\n'
+
+
+def samples():
+    for directory, _, files in os.walk(SAMPLES):
+        for file in sorted(files):
+            if file.endswith(('.m', '.txt')):
+                yield os.path.join(directory, file)
+
+
+def output(path: str, *args: str):
+    result = subprocess.run([sys.executable, os.path.join(ROOT, 'main.py'), *args, path],
+                            capture_output=True, text=True, timeout=600)
+    return result.stdout
+
+
+def main():
+    failures = 0
+
+    with tempfile.TemporaryDirectory() as directory:
+        files = {}   # label: the copy that runs
+        for file in sys.argv[1:] or sorted(samples()):
+            label = os.path.relpath(file, SAMPLES) if not sys.argv[1:] else file
+            files[label] = os.path.join(directory, f'{len(files)}_{os.path.basename(file)}')
+            shutil.copyfile(file, files[label])
+        files['deep nesting'] = os.path.join(directory, 'deep_nesting.m')
+        with open(files['deep nesting'], 'w') as f:
+            f.write(DEEP)
+
+        for name, path in files.items():
+            for optimization in ([], ['--no-optimize']):
+                expected = output(path, '--engine=tree', '--no-cache', *optimization)
+                runs = {
+                    'no cache': output(path, '--engine=cpython', '--no-cache', *optimization),
+                    'storing': output(path, '--engine=cpython', *optimization),
+                    'cached': output(path, '--engine=cpython', *optimization),
+                }
+                different = [name for name, stdout in runs.items() if stdout != expected]
+                label = f"{name} {' '.join(optimization) or '(optimized)'}"
+                print(f"{label:<40} {'DIFF ' + ', '.join(different) if different else 'ok'}")
+                failures += bool(different)
+
+    print(f'{failures} differences')
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""Runs a small script many times as a main.py process, as a client.py call and
+straight over the socket of a `main.py --serve` server.
+
+Usage: python benchmarks/daemon.py [runs] [workers]   (default: 50 runs, one worker per CPU)
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from client import send
+
+SCRIPT = """
+x = 1;
+A = ones(3, 3);
+for k = 0:20 { x += k; }
+print x, A[1, 1];
+"""
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    workers = sys.argv[2] if len(sys.argv) > 2 else str(os.cpu_count() or 1)
+
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, 'script.m')
+        with open(filename, 'w') as f:
+            f.write(SCRIPT)
+        path = os.path.join(directory, 'server.sock')
+
+        start = time.perf_counter()
+        for _ in range(runs):
+            subprocess.run([sys.executable, os.path.join(ROOT, 'main.py'), '--no-cache', filename],
+                           capture_output=True, check=True)
+        processes = time.perf_counter() - start
+
+        server = subprocess.Popen([sys.executable, os.path.join(ROOT, 'main.py'), '--serve', path,
+                                   '--workers', workers], stderr=subprocess.PIPE)
+        try:
+            server.stderr.readline()    # Serving on ...
+
+            start = time.perf_counter()
+            for _ in range(runs):
+                subprocess.run([sys.executable, os.path.join(ROOT, 'client.py'), path, filename],
+                               capture_output=True, check=True)
+            clients = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for _ in range(runs):
+                send(path, SCRIPT)
+            requests = time.perf_counter() - start
+        finally:
+            server.terminate()
+            server.wait()
+
+    print(f'{runs} runs: {processes / runs * 1e3:.1f} ms per process, {clients / runs * 1e3:.1f} ms per client.py, '
+          f'{requests / runs * 1e3:.2f} ms per request')
+
+
+if __name__ == '__main__':
+    main()
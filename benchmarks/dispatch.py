@@ -0,0 +1,64 @@
+"""Measures the cost of dispatching one AST node through an @on/@when visitor.
+
+Prints nanoseconds per node for a trivial node (IntNum) through
+node.accept(visitor), through visitor.visit(node), through the
+single-argument path, and for calling the
+registered target directly, plus the dispatch overhead per node.
+
+Usage: python benchmarks/dispatch.py [calls]
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import AST
+from visit import on, when
+
+
+class Visitor(object):
+
+    @on('node')
+    def visit(self, node):
+        pass
+
+    @when(AST.IntNum)
+    def visit(self, node):
+        return node.value
+
+    @when(AST.Node)
+    def visit(self, node):
+        return None
+
+
+def target(visitor, node):
+    return node.value
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    visitor = Visitor()
+    node = AST.IntNum(0, 1)
+    subclass_node = AST.String(0, 'x')    # only reachable through the AST.Node target
+    single = Visitor.visit.dispatcher.single
+
+    cases = {
+        'node.accept(visitor)': lambda: node.accept(visitor),
+        'visitor.visit(node)': lambda: visitor.visit(node),
+        'visitor.visit(subclass node)': lambda: visitor.visit(subclass_node),
+        'Visitor.visit.single': lambda: single(visitor, node),
+        'direct target call': lambda: target(visitor, node),
+    }
+
+    results = {}
+    for name, case in cases.items():
+        results[name] = min(timeit.repeat(case, number=calls, repeat=5)) / calls * 1e9
+        print(f'{name:30} {results[name]:8.1f} ns/node')
+
+    overhead = results['node.accept(visitor)'] - results['direct target call']
+    print(f"{'dispatch overhead':30} {overhead:8.1f} ns/node")
+
+
+if __name__ == '__main__':
+    main()
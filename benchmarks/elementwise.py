@@ -0,0 +1,56 @@
+"""Times the element-wise chain A .* B .+ C ./ D, one operation at a time and fused.
+
+One operation at a time is how the chain runs without the Optimizer: every
+operator allocates an intermediate matrix. The fused kernels compute each
+element of the result in one pass.
+
+Usage: python benchmarks/elementwise.py [size]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import interpreter
+import numpy_backend
+from matrix import Matrix
+
+
+CODE = (0, 1, '.*', 2, 3, './', '.+')
+
+
+def random_matrix(rows, cols):
+    return Matrix.from_values([Matrix.from_values([random.random() + 1 for _ in range(cols)], 'float')
+                               for _ in range(rows)], 'float')
+
+
+def separate(backend, a, b, c, d):
+    return backend.mat_elements_op(backend.mat_elements_op(a, b, '*'), backend.mat_elements_op(c, d, '/'), '+')
+
+
+def measure(fn, *args, repeat=5):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    random.seed(0)
+    operands = [random_matrix(size, size) for _ in range(4)]
+
+    backends = [('python', interpreter)] + ([('numpy', numpy_backend)] if numpy_backend.numpy else [])
+    print(f"{'backend':>8} {'separate':>9} {'fused':>9}")
+    for name, backend in backends:
+        assert separate(backend, *operands) == backend.mat_fused(CODE, operands)
+        print(f'{name:>8} {measure(separate, backend, *operands):9.4f} {measure(backend.mat_fused, CODE, operands):9.4f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""Times matrix multiplication kernels on square and rectangular shapes.
+
+Compares the old list-of-lists triple loop with the blocked pure-Python
+kernel (serial and split over worker processes) and, when installed, NumPy.
+
+Usage: python benchmarks/matmul.py [workers]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import interpreter
+import numpy_backend
+from matrix import Matrix
+
+
+SHAPES = [
+    ((100, 100), (100, 100)),
+    ((250, 250), (250, 250)),
+    ((400, 40), (40, 400)),
+    ((40, 400), (400, 40)),
+    ((1, 600), (600, 600)),
+]
+
+
+def naive_mul(a, b):
+    res = [[0] * len(b[0]) for _ in range(len(a))]
+    for i in range(len(a)):
+        for j in range(len(b[0])):
+            s = 0
+            for k in range(len(b)):
+                s += a[i][k] * b[k][j]
+            res[i][j] = s
+    return res
+
+
+def random_matrix(rows, cols):
+    return Matrix.from_values([Matrix.from_values([random.random() for _ in range(cols)], 'float')
+                               for _ in range(rows)], 'float')
+
+
+def measure(fn, *args):
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+def parallel_mul(a, b):
+    threshold = interpreter.MATMUL_PARALLEL_THRESHOLD
+    interpreter.MATMUL_PARALLEL_THRESHOLD = 0
+    try:
+        return interpreter.mat_mul(a, b)
+    finally:
+        interpreter.MATMUL_PARALLEL_THRESHOLD = threshold
+
+
+def main():
+    interpreter.MATMUL_WORKERS = int(sys.argv[1]) if len(sys.argv) > 1 else (os.cpu_count() or 1)
+    random.seed(0)
+
+    print(f"{'shape':>22} {'naive':>8} {'blocked':>8} {'parallel':>8} {'numpy':>8}")
+    for a_shape, b_shape in SHAPES:
+        a, b = random_matrix(*a_shape), random_matrix(*b_shape)
+        times = [
+            measure(naive_mul, a.tolist(), b.tolist()),
+            measure(interpreter.mat_mul, a, b),
+            measure(parallel_mul, a, b) if interpreter.MATMUL_WORKERS > 1 else None,
+            measure(numpy_backend.mat_mul, a, b) if numpy_backend.numpy else None,
+        ]
+        name = f'{a_shape[0]}x{a_shape[1]} * {b_shape[0]}x{b_shape[1]}'
+        print(f'{name:>22}', *(f'{t:8.3f}' if t is not None else f"{'-':>8}" for t in times))
+
+
+if __name__ == '__main__':
+    main()
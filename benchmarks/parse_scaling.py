@@ -0,0 +1,36 @@
+"""Parses generated scripts of growing length to check Program construction scales linearly.
+
+Usage: python benchmarks/parse_scaling.py [sizes...]   (default: 10000 100000)
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scanner import Scanner
+from parser import Mparser
+
+
+def generate(statements):
+    lines = ['x = 0;']
+    for i in range(statements - 1):
+        lines.append(f'x = x + {i % 7};' if i % 3 else f'if (x > {i}) x = 0;')
+    return '\n'.join(lines)
+
+
+def main():
+    sizes = [int(n) for n in sys.argv[1:]] or [10000, 100000]
+
+    for n in sizes:
+        text = generate(n)
+        parser = Mparser()
+        start = time.perf_counter()
+        program = parser.parse(Scanner().tokenize(text))
+        elapsed = time.perf_counter() - start
+        assert len(program.instructions) == n
+        print(f'{n:>8} statements {elapsed:8.3f}s {elapsed / n * 1e6:8.2f} us/statement')
+
+
+if __name__ == '__main__':
+    main()
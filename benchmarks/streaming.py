@@ -0,0 +1,58 @@
+"""Runs a generated script of many top-level statements whole and with --stream,
+reporting time and peak memory of each run.
+
+Usage: python benchmarks/streaming.py [statements]   (default: 20000)
+"""
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def generate(statements):
+    lines = ['x = 0;', 'A = ones(3, 3);']
+    for i in range(statements - 3):
+        if i % 3 == 0:
+            lines.append(f'x = x + {i % 7};')
+        elif i % 3 == 1:
+            lines.append(f'if (x > {i}) {{ x = 0; }} else {{ A[0, 0] = {i}; }}')
+        else:
+            lines.append('for k = 0:2 { A[k, 1] = A[k, 1] + 1; }')
+    lines.append('print x;')
+    return '\n'.join(lines)
+
+
+def measure(filename, *options):
+    # each run is a child process of its own, so RUSAGE_CHILDREN's peak is the largest run so far
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, os.path.join(ROOT, 'main.py'), '--no-cache', *options, filename],
+                            capture_output=True, text=True, check=True)
+    elapsed = time.perf_counter() - start
+    return elapsed, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss // 1024, result.stdout
+
+
+def main():
+    statements = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+
+    text = generate(statements)
+    with tempfile.NamedTemporaryFile('w', suffix='.m', delete=False) as script:
+        script.write(text)
+    try:
+        # streaming first: the peak of the whole-file run would hide its own
+        stream_time, stream_peak, stream_output = measure(script.name, '--stream')
+        whole_time, whole_peak, whole_output = measure(script.name)
+        assert stream_output == whole_output
+    finally:
+        os.unlink(script.name)
+
+    print(f'{statements} statements, {len(text) // 1024} KiB of source')
+    print(f'  whole   {whole_time:7.2f}s {whole_peak:6d} MiB peak')
+    print(f'  stream  {stream_time:7.2f}s {stream_peak:6d} MiB peak')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,222 @@
+"""Times every pipeline phase on scaled-up versions of the samples/lab5 programs.
+
+Each program runs at three sizes; every phase (scan, parse, check, optimize,
+interpret) is timed on its own, best of --repeat runs. The results are
+written as JSON, and compared with a baseline written the same way, a phase
+more than --threshold slower than in the baseline is a regression:
+
+    python benchmarks/suite.py --output baseline.json
+    python benchmarks/suite.py --baseline baseline.json    # exits 1 on regressions
+
+Usage: python benchmarks/suite.py [programs...] [--scale X] [--repeat N] [--output FILE] [--baseline FILE]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scanner import Scanner
+from parser import Mparser
+from type_checker import TypeChecker
+from interpreter import Interpreter, use_backend
+from optimizer import Optimizer
+from loop_hoister import LoopHoister
+from vectorizer import Vectorizer
+
+# samples/lab5 with their fixed bounds made {n}, and the sizes n takes
+PROGRAMS = {
+    'primes': ("""
+for n = 2:{n} {{
+    p = 1;
+    for d = 2:n-1 {{
+        nc = n;
+        while (nc > 0) nc -= d;
+        if (nc == 0) {{
+            p = 0;
+            break;
+        }}
+    }}
+    if (p == 1) {{
+        print n;
+    }}
+}}
+""", [100, 200, 400]),
+
+    'fibonacci': ("""
+a = 0;
+b = 1;
+for i = 1:{n} {{
+    b += a;
+    a = b - a;
+    if (b > 1000000) {{
+        print b;
+        a = 0;
+        b = 1;
+    }}
+}}
+""", [10000, 20000, 40000]),
+
+    'matrix': ("""
+A = eye({n});
+B = ones({n});
+C = A .+ B;
+D = zeros({n}, {n});
+for i = 0:{n}-1 {{
+    for j = 0:{n}-1 {{
+        D[i, j] = A[i, j] * 2 + i;
+    }}
+}}
+D[1:{n}, 2:{n}] = 7;
+E = D * C;
+print E[1, 1];
+""", [20, 40, 80]),
+
+    'pi': ("""
+pi = 0.0;
+n = 1;
+for i = 1:{n} {{
+    pi += 4.0 / n - 4.0 / (n + 2);
+    n += 4;
+}}
+print pi;
+""", [10000, 20000, 40000]),
+
+    'sqrt': ("""
+for x = 1:9 {{
+    sqrt_x = 1.0;
+    for i = 1:{n} sqrt_x = (sqrt_x + x / sqrt_x) / 2;
+    print x, sqrt_x;
+}}
+""", [1000, 2000, 4000]),
+
+    'triangle': ("""
+n = {n};
+for i = 1:n print "*" * i;
+""", [250, 500, 1000]),
+}
+
+# the smallest n a program checks with, whatever --scale: matrix assigns D[1:n, 2:n]
+SMALLEST = {'matrix': 3}
+
+PHASES = ('scan', 'parse', 'check', 'optimize', 'interpret')
+
+
+def parse_args():
+    arg_parser = argparse.ArgumentParser(description="Time the pipeline phases on the lab5 programs")
+    arg_parser.add_argument("programs", nargs="*",
+                            help=f"programs to run, of {', '.join(PROGRAMS)} (default: all)")
+    arg_parser.add_argument("--scale", type=float, default=1.0, help="multiply every problem size by X")
+    arg_parser.add_argument("--repeat", type=int, default=3, help="runs per phase, the fastest counts")
+    arg_parser.add_argument("--backend", choices=["auto", "python", "numpy"],
+                            default=os.environ.get("MATRIX_BACKEND", "auto"))
+    arg_parser.add_argument("--output", metavar="FILE", help="write the JSON results to FILE")
+    arg_parser.add_argument("--baseline", metavar="FILE", help="compare with the JSON results in FILE")
+    arg_parser.add_argument("--threshold", type=float, default=0.25,
+                            help="relative slowdown that is a regression (default: 0.25)")
+    arg_parser.add_argument("--min-time", type=float, default=0.001,
+                            help="ignore phases faster than this many seconds in the baseline (default: 0.001)")
+    args = arg_parser.parse_args()
+    for program in args.programs:
+        if program not in PROGRAMS:
+            arg_parser.error(f"unknown program '{program}'")
+    return args
+
+
+def run(text):
+    """Returns the time of every phase on text, in seconds; ValueError if text fails to check."""
+    timings = {}
+    start = time.perf_counter()
+    tokens = list(Scanner().tokenize(text))
+    timings['scan'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    ast = Mparser().parse(iter(tokens))
+    timings['parse'] = time.perf_counter() - start
+
+    checker = TypeChecker()
+    start = time.perf_counter()
+    checker.visit(ast)
+    timings['check'] = time.perf_counter() - start
+    if checker.errors:
+        raise ValueError('; '.join(checker.errors))
+
+    start = time.perf_counter()
+    ast = LoopHoister().visit(Optimizer().visit(Vectorizer().visit(ast)))
+    timings['optimize'] = time.perf_counter() - start
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        ast.accept(Interpreter(), toplevel=True)
+        timings['interpret'] = time.perf_counter() - start
+    return timings
+
+
+def measure(text, repeat):
+    # the fastest time of every phase over repeat runs of the whole pipeline
+    runs = [run(text) for _ in range(repeat)]
+    return {phase: min(timings[phase] for timings in runs) for phase in PHASES}
+
+
+def compare(results, baseline, threshold, min_time):
+    """Yields a line for every phase more than threshold slower than in baseline."""
+    for name, timings in results.items():
+        for phase, elapsed in timings.items():
+            before = baseline.get(name, {}).get(phase)
+            if before is not None and before >= min_time and elapsed > before * (1 + threshold):
+                yield f'{name} {phase}: {before * 1e3:.2f} ms -> {elapsed * 1e3:.2f} ms (+{elapsed / before - 1:.0%})'
+
+
+def main():
+    args = parse_args()
+    use_backend(args.backend)
+
+    results = {}
+    failures = 0
+    for program in args.programs or PROGRAMS:
+        template, sizes = PROGRAMS[program]
+        for size in sizes:
+            n = max(SMALLEST.get(program, 1), round(size * args.scale))
+            try:
+                timings = measure(template.format(n=n), args.repeat)
+            except ValueError as e:
+                # reported and left out of the results, the other programs still run
+                print(f'{program + "/" + str(n):<18}fails to check: {e}')
+                failures += 1
+                continue
+            results[f'{program}/{n}'] = timings
+            print(f'{program + "/" + str(n):<18}' + ''.join(f'{phase} {timings[phase] * 1e3:9.2f} ms  '
+                                                             for phase in PHASES))
+
+    report = {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'backend': args.backend,
+        'repeat': args.repeat,
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = list(compare(results, baseline['results'], args.threshold, args.min_time))
+        for line in regressions:
+            print(f'REGRESSION {line}')
+        # runs at other sizes (another --scale) have nothing to compare with
+        matched = len(results.keys() & baseline['results'].keys())
+        print(f'{len(regressions)} regressions in {matched} of {len(results)} runs compared with {args.baseline}')
+        sys.exit(1 if regressions or failures else 0)
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
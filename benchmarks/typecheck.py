@@ -0,0 +1,70 @@
+"""Type checks a large generated script, with and without type errors, and checks the ttype table stays frozen.
+
+Every block declares numbers, strings and matrices and combines them in
+expressions, compound assignments, loops and ifs; the erroneous variant adds
+undeclared variables and operations on types that do not support them, the
+lookups that used to add entries to the table.
+
+Usage: python benchmarks/typecheck.py [blocks] [repeat]   (default: 5000 3)
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scanner import Scanner
+from parser import Mparser
+from type_checker import TypeChecker, ttype
+
+BLOCK = """
+a{i} = {i};
+b{i} = a{i} * 2.5 + a{i} / 3;
+s{i} = "x" + "y";
+M{i} = ones(3);
+N{i} = M{i} .+ M{i} * M{i}';
+for k = 1:{i} {{
+    a{i} += k;
+    b{i} -= a{i} * k;
+}}
+if (b{i} > a{i}) print b{i}; else print s{i} * 2;
+"""
+
+ERRORS = """
+e{i} = u{i} + {i};
+f{i} = s{i} - a{i};
+g{i} = M{i} / b{i};
+h{i} = -s{i};
+"""
+
+
+def generate(blocks, errors):
+    template = BLOCK + ERRORS if errors else BLOCK
+    return ''.join(template.format(i=i) for i in range(blocks))
+
+
+def main():
+    blocks = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    entries = len(ttype)
+
+    for errors in (False, True):
+        text = generate(blocks, errors)
+        best = float('inf')
+        for _ in range(repeat):
+            # checking annotates the tree, each run gets a freshly parsed one
+            program = Mparser().parse(Scanner().tokenize(text))
+            checker = TypeChecker()
+            start = time.perf_counter()
+            checker.visit(program)
+            best = min(best, time.perf_counter() - start)
+
+        statements = len(program.instructions)
+        print(f"{'with errors' if errors else 'well-typed':<12} {statements:>7} statements {best:8.3f}s "
+              f"{best / statements * 1e6:7.2f} us/statement  {len(checker.errors):>6} errors  "
+              f"ttype {entries} -> {len(ttype)} entries")
+        assert len(ttype) == entries
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""Times an element-by-element loop nest run as loops and vectorized, on every engine.
+
+Usage: python benchmarks/vectorize.py [size] [repeat]
+"""
+import contextlib
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scanner import Scanner
+from parser import Mparser
+from type_checker import TypeChecker
+from interpreter import Interpreter, use_backend
+from closure_compiler import ClosureCompiler
+from vectorizer import Vectorizer
+
+
+NEST = """
+A = ones({size}, {size});
+B = zeros({size}, {size});
+C = zeros({size}, {size});
+for i = 0:{size}-1 {{
+    for j = 0:{size}-1 {{
+        C[i, j] = A[i, j] * 2 + B[i, j];
+    }}
+}}
+print C[0, 0];
+"""
+
+ENGINES = {
+    'tree': lambda ast: ast.accept(Interpreter(), toplevel=True),
+    'closure': lambda ast: ClosureCompiler().run(ast),
+}
+
+
+def compile_source(text, vectorize):
+    ast = Mparser().parse(Scanner().tokenize(text))
+    checker = TypeChecker()
+    checker.visit(ast)
+    assert not checker.errors, checker.errors
+    return Vectorizer().visit(ast) if vectorize else ast
+
+
+def measure(text, engine, vectorize, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        ast = compile_source(text, vectorize)
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            ENGINES[engine](ast)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    text = NEST.format(size=size)
+
+    print(f"{'backend':8} {'engine':8} {'loops':>8} {'vectorized':>10}")
+    for backend in ('python', 'numpy'):
+        use_backend(backend)
+        for engine in ENGINES:
+            loops = measure(text, engine, False, repeat)
+            vectorized = measure(text, engine, True, repeat)
+            print(f'{backend:8} {engine:8} {loops:7.3f}s {vectorized:9.4f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""Times transposes and slices taken as strided views against copying them out.
+
+A view only records (owner, offset, strides), so taking A' or A[i:j, k:l]
+does not touch the elements; the copy column is what the same operation
+costs when the elements are copied into a buffer of their own right away.
+
+Usage: python benchmarks/views.py [size]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from matrix import Matrix
+
+
+def measure(fn, *args, repeat=5):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def transpose(a):
+    return a.transpose()
+
+
+def transpose_copy(a):
+    return a.transpose().copy()
+
+
+def block(a):
+    half = a.shape[0] // 2
+    return a[slice(0, half), slice(half, a.shape[1])]
+
+
+def block_copy(a):
+    return block(a).copy()
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    a = Matrix.filled(1.0, size, size)
+
+    print(f"{'operation':>10} {'view':>9} {'copy':>9}")
+    for name, view, copy in (('transpose', transpose, transpose_copy), ('block', block, block_copy)):
+        assert view(a) == copy(a)
+        print(f'{name:>10} {measure(view, a):9.6f} {measure(copy, a):9.4f}')
+
+
+if __name__ == '__main__':
+    main()
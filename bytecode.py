@@ -0,0 +1,456 @@
+from array import array
+from dataclasses import dataclass
+import struct
+import sys
+import AST
+from visit import on, when
+
+# opcodes; every instruction is one opcode in Bytecode.ops and one operand in Bytecode.args
+HALT = 0
+CONST = 1               # push consts[arg]
+LOAD = 2                # push the variable arg
+STORE = 3               # pop into the variable arg, sharing a matrix like an assignment does
+STORE_RAW = 4           # pop into the variable arg as it is
+DUP = 5
+POP = 6
+INDEX = 7               # pop arg indices and a matrix, push its element, row or view
+STORE_INDEX = 8         # pop arg indices, a matrix and a value, assign the value there
+SLICE = 9               # pop end and start, push a Range's slice
+BINARY = 10             # pop right and left, push left consts[arg] right
+COMPOUND = 11           # pop the old value and the value, push old consts[arg] value
+FUSED = 12              # consts[arg] is (code, operand count)
+NEG = 13
+TRANSPOSE = 14
+VECTOR = 15             # consts[arg] is (value count, elements type)
+CALL = 16               # consts[arg] is (function name, argument count)
+PRINT = 17              # pop and print one value of a print instruction
+PRINT_END = 18
+RETURN_VALUE = 19       # pop the value the program returns and stop
+JUMP = 20               # jump to arg
+JUMP_IF_FALSE = 21      # pop, jump to arg if false
+JUMP_IF_NOT_NONE = 22   # jump to arg if the top is not None, else pop it
+FOR_RANGE = 23          # pop a Range's slice, push the iterator over the loop's values
+FOR_ITER = 24           # push the iterator's next value, or pop the iterator and jump to arg
+PUSH_FRAME = 25         # push a frame of arg slots
+POP_FRAME = 26
+CLEAR_HOISTED = 27      # consts[arg] is the global slots to clear
+SET_SLICES = 28         # consts[arg] is the loop variables of a VectorizedLoop, see BytecodeCompiler
+JUMP_IF_EMPTY = 29      # pop a Range's slice and jump to arg if it is empty, else leave it
+STORE_LAST = 30         # pop a Range's slice into the variable arg as the last value of its loop
+
+# a variable operand is its depth and slot in one int
+SLOT_BITS = 20
+SLOT_MASK = (1 << SLOT_BITS) - 1
+MAX_DEPTH = (1 << (31 - SLOT_BITS)) - 1
+
+MAGIC = b'MBC\0'
+FORMAT_VERSION = 2      # bumped whenever an opcode or what its operand means changes
+HEADER = struct.Struct('<4sHHIII')     # magic, format version, reserved, frame size, instructions, constants
+
+
+@dataclass
+class Bytecode(object):
+    ops: array              # 'B' opcodes
+    args: array             # 'i' operands, one per opcode
+    consts: list            # None, ints, floats, strings and tuples of them
+    frame_size: int         # slots of the global frame
+
+
+def variable(depth: int, slot: int):
+    if slot > SLOT_MASK or depth > MAX_DEPTH:
+        raise ValueError(f'Variable slot {slot} at depth {depth} does not fit a bytecode operand')
+    return depth << SLOT_BITS | slot
+
+
+class BytecodeCompiler(object):
+    """Compiles a type-checked AST.Program into stack-based Bytecode for the VM.
+
+    Expressions leave their value on the stack, instructions leave it as it
+    was. Scopes push and pop frames where the Interpreter does, so variables
+    keep the (depth, slot) the TypeChecker gave them. Loops and ifs become
+    jumps; break and continue pop the frames pushed inside the loop body
+    before they jump. A return stops the VM wherever it is.
+    """
+
+    def __init__(self):
+        self.ops = array('B')
+        self.args = array('i')
+        self.consts = []
+        self.const_indices = {}
+        self.loops = []     # enclosing loops, innermost last: [continue target, break jumps, frames pushed in the body]
+
+
+    def emit(self, op: int, arg: int = 0):
+        # appends an instruction, returning its position for patch
+        self.ops.append(op)
+        self.args.append(arg)
+        return len(self.ops) - 1
+
+
+    def patch(self, position: int, target: int | None = None):
+        # points the jump at position to target, by default the next instruction emitted
+        self.args[position] = len(self.ops) if target is None else target
+
+
+    def constant(self, value):
+        # 1, 1.0 and True are equal keys, their reprs are not
+        key = (value.__class__, repr(value))
+        index = self.const_indices.get(key)
+        if index is None:
+            index = self.const_indices[key] = len(self.consts)
+            self.consts.append(value)
+        return index
+
+
+    @on('node')
+    def compile(self, node):
+        pass
+
+
+    @when(AST.IntNum)
+    def compile(self, node: AST.IntNum):
+        self.emit(CONST, self.constant(node.value))
+
+
+    @when(AST.FloatNum)
+    def compile(self, node: AST.FloatNum):
+        self.emit(CONST, self.constant(node.value))
+
+
+    @when(AST.String)
+    def compile(self, node: AST.String):
+        self.emit(CONST, self.constant(node.value))
+
+
+    @when(AST.Variable)
+    def compile(self, node: AST.Variable):
+        self.emit(LOAD, variable(node.depth, node.slot))
+
+
+    @when(AST.Ref)
+    def compile(self, node: AST.Ref):
+        self.compile(node.variable)
+        for index in node.indices:
+            self.compile(index)
+        self.emit(INDEX, len(node.indices))
+
+
+    @when(AST.Range)
+    def compile(self, node: AST.Range):
+        self.compile(node.start)
+        self.compile(node.end)
+        self.emit(SLICE)
+
+
+    @when(AST.BinExpr)
+    def compile(self, node: AST.BinExpr):
+        self.compile(node.left)
+        self.compile(node.right)
+        self.emit(BINARY, self.constant(node.op))
+
+
+    @when(AST.FusedExpr)
+    def compile(self, node: AST.FusedExpr):
+        for operand in node.operands:
+            self.compile(operand)
+        self.emit(FUSED, self.constant((node.code, len(node.operands))))
+
+
+    @when(AST.UnaryExpr)
+    def compile(self, node: AST.UnaryExpr):
+        self.compile(node.value)
+        if node.op == '-':
+            self.emit(NEG)
+        elif node.op == 'TRANSPOSE':
+            self.emit(TRANSPOSE)
+        else:
+            self.emit(POP)
+            self.emit(CONST, self.constant(None))
+
+
+    @when(AST.Vector)
+    def compile(self, node: AST.Vector):
+        for value in node.values:
+            self.compile(value)
+        self.emit(VECTOR, self.constant((len(node.values), node.elements_type)))
+
+
+    @when(AST.FunctionCall)
+    def compile(self, node: AST.FunctionCall):
+        for arg in node.args:
+            self.compile(arg)
+        self.emit(CALL, self.constant((node.name, len(node.args))))
+
+
+    @when(AST.Assignment)
+    def compile(self, node: AST.Assignment):
+        self.compile(node.value)
+
+        if node.instr != '=':
+            self.compile(node.ref)
+            self.emit(COMPOUND, self.constant(node.instr[0]))
+
+        if isinstance(node.ref, AST.Variable):
+            self.emit(STORE, variable(node.ref.depth, node.ref.slot))
+        elif isinstance(node.ref, AST.Ref):
+            self.compile(node.ref.variable)
+            for index in node.ref.indices:
+                self.compile(index)
+            self.emit(STORE_INDEX, len(node.ref.indices))
+
+
+    @when(AST.ReturnInstr)
+    def compile(self, node: AST.ReturnInstr):
+        self.compile(node.value)
+        self.emit(RETURN_VALUE)
+
+
+    @when(AST.SpecialInstr)
+    def compile(self, node: AST.SpecialInstr):
+        continue_target, breaks, frames = self.loops[-1]
+        for _ in range(frames):
+            self.emit(POP_FRAME)
+        if node.name == 'continue':
+            self.emit(JUMP, continue_target)
+        elif node.name == 'break':
+            breaks.append(self.emit(JUMP))
+
+
+    @when(AST.IfElseInstr)
+    def compile(self, node: AST.IfElseInstr):
+        self.compile(node.condition)
+        to_else = self.emit(JUMP_IF_FALSE)
+        self.scoped(node.then_block, node.then_frame_size)
+
+        if node.else_block:
+            to_end = self.emit(JUMP)
+            self.patch(to_else)
+            self.scoped(node.else_block, node.else_frame_size)
+            self.patch(to_end)
+        else:
+            self.patch(to_else)
+
+
+    @when(AST.PrintInstr)
+    def compile(self, node: AST.PrintInstr):
+        # printed one by one, an argument that fails leaves the ones before it printed
+        for arg in node.args:
+            self.compile(arg)
+            self.emit(PRINT)
+        self.emit(PRINT_END)
+
+
+    @when(AST.ForLoop)
+    def compile(self, node: AST.ForLoop):
+        self.compile(node.var_range)
+        self.clear_hoisted(node.hoisted)
+        if node.frame_size:
+            self.emit(PUSH_FRAME, node.frame_size)
+
+        self.emit(FOR_RANGE)
+        start = self.emit(FOR_ITER)
+        self.emit(STORE_RAW, variable(node.variable.depth, node.variable.slot))
+        breaks = self.loop_block(node.block, start)
+        self.emit(JUMP, start)
+
+        # a break leaves the iterator on the stack, the end of the range has popped it
+        for jump in breaks:
+            self.patch(jump)
+        self.emit(POP)
+        self.patch(start)
+
+        if node.frame_size:
+            self.emit(POP_FRAME)
+
+
+    @when(AST.VectorizedLoop)
+    def compile(self, node: AST.VectorizedLoop):
+        # the ranges stay on the stack, an empty one skips the ranges inside it and the
+        # assignment; SET_SLICES sets the loop variables to the slices the ranges cover
+        empty = []
+        for loop in node.loops:
+            self.compile(loop.var_range)
+            empty.append(self.emit(JUMP_IF_EMPTY))
+            if loop.frame_size:
+                self.emit(PUSH_FRAME, loop.frame_size)
+
+        loop_variables = tuple(variable(loop.variable.depth, loop.variable.slot) for loop in node.loops)
+        self.emit(SET_SLICES, self.constant(loop_variables))
+        self.compile(node.assignment)
+
+        # innermost first, every loop that ran leaves its variable at the last value;
+        # an empty range jumps past its own loop's part
+        for loop, jump in reversed(list(zip(node.loops, empty))):
+            self.emit(STORE_LAST, variable(loop.variable.depth, loop.variable.slot))
+            if loop.frame_size:
+                self.emit(POP_FRAME)
+            self.patch(jump)
+
+
+    @when(AST.WhileLoop)
+    def compile(self, node: AST.WhileLoop):
+        self.clear_hoisted(node.hoisted)
+        if node.frame_size:
+            self.emit(PUSH_FRAME, node.frame_size)
+
+        start = len(self.ops)
+        self.compile(node.condition)
+        to_end = self.emit(JUMP_IF_FALSE)
+        breaks = self.loop_block(node.block, start)
+        self.emit(JUMP, start)
+
+        self.patch(to_end)
+        for jump in breaks:
+            self.patch(jump)
+
+        if node.frame_size:
+            self.emit(POP_FRAME)
+
+
+    @when(AST.Program)
+    def compile(self, node: AST.Program):
+        for instruction in node.instructions:
+            if isinstance(instruction, AST.Program):
+                self.scoped(instruction, instruction.frame_size)
+            else:
+                self.compile(instruction)
+
+
+    @when(AST.Hoisted)
+    def compile(self, node: AST.Hoisted):
+        slot = variable(0, node.slot)
+        self.emit(LOAD, slot)
+        cached = self.emit(JUMP_IF_NOT_NONE)
+        self.compile(node.value)
+        self.emit(DUP)
+        self.emit(STORE_RAW, slot)
+        self.patch(cached)
+
+
+    def loop_block(self, block: AST.Node, continue_target: int):
+        # compiles a loop body, returning the positions of its break jumps
+        loop = [continue_target, [], 0]
+        self.loops.append(loop)
+        self.compile(block)
+        self.loops.pop()
+        return loop[1]
+
+
+    def clear_hoisted(self, slots: list[int]):
+        if slots:
+            self.emit(CLEAR_HOISTED, self.constant(tuple(slots)))
+
+
+    def scoped(self, node: AST.Node, frame_size: int):
+        # scopes that declare nothing get no frame of their own
+        if not frame_size:
+            return self.compile(node)
+
+        self.emit(PUSH_FRAME, frame_size)
+        if self.loops:
+            self.loops[-1][2] += 1
+        self.compile(node)
+        if self.loops:
+            self.loops[-1][2] -= 1
+        self.emit(POP_FRAME)
+
+
+def compile_program(program: AST.Program):
+    """Returns the Bytecode of a type-checked (and optimized) program."""
+    compiler = BytecodeCompiler()
+    compiler.compile(program)
+    compiler.emit(HALT)
+    return Bytecode(compiler.ops, compiler.args, compiler.consts, program.frame_size)
+
+
+# ---------- .mbc files ----------
+# the header, the opcodes, the operands as little-endian int32 and the constants,
+# each a tag byte and its value: N None, I int (decimal), D float (float64),
+# S str (utf-8), T tuple; lengths and counts are uint32
+
+
+def dump(code: Bytecode, file):
+    """Writes code to the binary file."""
+    file.write(HEADER.pack(MAGIC, FORMAT_VERSION, 0, code.frame_size, len(code.ops), len(code.consts)))
+    file.write(code.ops.tobytes())
+    args = array('i', code.args)
+    if sys.byteorder == 'big':
+        args.byteswap()
+    file.write(args.tobytes())
+    for value in code.consts:
+        file.write(encode(value))
+
+
+def load(file):
+    """Reads the Bytecode in the binary file, raising ValueError if it is not one this version runs."""
+    data = file.read()
+    if len(data) < HEADER.size or data[:len(MAGIC)] != MAGIC:
+        raise ValueError('Not a bytecode file')
+    _, version, _, frame_size, count, const_count = HEADER.unpack_from(data)
+    if version != FORMAT_VERSION:
+        raise ValueError(f'Bytecode format {version}, this interpreter runs format {FORMAT_VERSION}')
+
+    try:
+        position = HEADER.size
+        ops = array('B', data[position:position + count])
+        position += count
+        args = array('i', data[position:position + 4 * count])
+        position += 4 * count
+        if len(ops) != count or len(args) != count:
+            raise ValueError('Truncated bytecode file')
+        if sys.byteorder == 'big':
+            args.byteswap()
+
+        consts = []
+        for _ in range(const_count):
+            value, position = decode(data, position)
+            consts.append(value)
+    except (struct.error, IndexError, UnicodeDecodeError):
+        raise ValueError('Truncated bytecode file') from None
+    return Bytecode(ops, args, consts, frame_size)
+
+
+def encode(value):
+    if value is None:
+        return b'N'
+    if isinstance(value, int):
+        return b'I' + encode_bytes(str(value).encode())
+    if isinstance(value, float):
+        return b'D' + struct.pack('<d', value)
+    if isinstance(value, str):
+        return b'S' + encode_bytes(value.encode())
+    if isinstance(value, tuple):
+        return b'T' + struct.pack('<I', len(value)) + b''.join(encode(item) for item in value)
+    raise ValueError(f'Cannot store the constant {value!r} in bytecode')
+
+
+def encode_bytes(value: bytes):
+    return struct.pack('<I', len(value)) + value
+
+
+def decode(data: bytes, position: int):
+    # returns the constant at position and the position after it
+    tag = data[position:position + 1]
+    position += 1
+    if tag == b'N':
+        return None, position
+    if tag == b'D':
+        return struct.unpack_from('<d', data, position)[0], position + 8
+    if tag == b'T':
+        count, = struct.unpack_from('<I', data, position)
+        position += 4
+        items = []
+        for _ in range(count):
+            item, position = decode(data, position)
+            items.append(item)
+        return tuple(items), position
+
+    size, = struct.unpack_from('<I', data, position)
+    raw = data[position + 4:position + 4 + size]
+    if len(raw) != size:
+        raise ValueError('Truncated bytecode file')
+    if tag == b'I':
+        return int(raw), position + 4 + size
+    if tag == b'S':
+        return raw.decode(), position + 4 + size
+    raise ValueError(f'Unknown constant tag {tag!r} in bytecode')
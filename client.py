@@ -0,0 +1,65 @@
+import argparse
+import json
+import socket
+import sys
+
+
+def parse_args():
+    arg_parser = argparse.ArgumentParser(description="Run a matrix script on a running `main.py --serve` server")
+    arg_parser.add_argument("socket", help="Unix socket the server listens on")
+    arg_parser.add_argument("filename")
+    arg_parser.add_argument("--engine", choices=["tree", "closure", "vm", "cpython"], default="tree",
+                            help="execution engine: tree-walking interpreter, compiled closures, bytecode VM "
+                                 "or a Python module run by CPython")
+    arg_parser.add_argument("--no-optimize", action="store_true",
+                            help="run the checked AST as written")
+    arg_parser.add_argument("--timing", action="store_true",
+                            help="print the run time and the server's total time for the request on stderr")
+    arg_parser.add_argument("--json", action="store_true",
+                            help="print the server's whole JSON reply instead of the script's output")
+    return arg_parser.parse_args()
+
+
+def send(path: str, source: str, engine: str = 'tree', optimize: bool = True):
+    """Runs source on the server listening at path and returns its reply."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(path)
+        client.sendall(json.dumps({'source': source, 'engine': engine, 'optimize': optimize}).encode())
+        client.shutdown(socket.SHUT_WR)
+
+        chunks = []
+        while chunk := client.recv(65536):
+            chunks.append(chunk)
+    return json.loads(b''.join(chunks))
+
+
+if __name__ == "__main__":
+    # only the standard library is imported here, the server holds the compiler
+    args = parse_args()
+
+    try:
+        with open(args.filename, "r") as file:
+            text = file.read()
+    except IOError:
+        print("Cannot open {0} file".format(args.filename))
+        sys.exit(0)
+
+    try:
+        reply = send(args.socket, text, args.engine, not args.no_optimize)
+    except OSError as e:
+        print(f"Cannot reach the server on {args.socket}: {e}", file=sys.stderr)
+        sys.exit(2)
+
+    if args.json:
+        json.dump(reply, sys.stdout, indent=2)
+        print()
+    else:
+        sys.stdout.write(reply['output'])
+        if reply['status'] not in ('ok', 'syntax error', 'type errors'):
+            # syntax and type errors are already part of the output, as they are when run locally
+            for error in reply['errors']:
+                print(error, file=sys.stderr)
+
+    if args.timing:
+        print(f"time {reply['time'] * 1e3:.3f} ms, total {reply['total'] * 1e3:.3f} ms", file=sys.stderr)
+    sys.exit(0 if reply['status'] == 'ok' else 1)
@@ -0,0 +1,335 @@
+import AST
+from matrix import Matrix
+from memory import FrameStack
+from interpreter import operations, mat_operations, mat_functions, mat_unary_operations, fused_expr, BREAK, CONTINUE, RETURN
+from visit import on, when
+
+
+class ClosureCompiler(object):
+    """Compiles a type-checked AST.Program into nested Python closures.
+
+    Every node is visited once, at compile time; the closure built for a node
+    calls the closures of its children directly, so executing the program does
+    no visitor dispatch at all. Semantics (scoping, control flow, printing)
+    follow the tree-walking Interpreter exactly.
+    """
+
+    def __init__(self):
+        self.memory = FrameStack()
+        self.return_value = None
+
+
+    def run(self, program: AST.Program):
+        self.memory = FrameStack(program.frame_size)
+        code = self.compile(program)
+        if code() == RETURN:
+            print(f'Program exited with value {self.return_value}')
+
+
+    @on('node')
+    def compile(self, node):
+        return lambda: None
+
+
+    @when(AST.IntNum)
+    def compile(self, node: AST.IntNum):
+        value = node.value
+        return lambda: value
+
+
+    @when(AST.FloatNum)
+    def compile(self, node: AST.FloatNum):
+        value = node.value
+        return lambda: value
+
+
+    @when(AST.Variable)
+    def compile(self, node: AST.Variable):
+        frames = self.memory.frames
+        depth, slot = node.depth, node.slot
+        return lambda: frames[depth][slot]
+
+
+    @when(AST.String)
+    def compile(self, node: AST.String):
+        value = node.value
+        return lambda: value
+
+
+    @when(AST.Ref)
+    def compile(self, node: AST.Ref):
+        variable = self.compile(node.variable)
+        indices = [self.compile(index) for index in node.indices]
+
+        return lambda: variable()[tuple(index() for index in indices)]
+
+
+    @when(AST.Range)
+    def compile(self, node: AST.Range):
+        start = self.compile(node.start)
+        end = self.compile(node.end)
+        return lambda: slice(start(), end())
+
+
+    @when(AST.BinExpr)
+    def compile(self, node: AST.BinExpr):
+        left = self.compile(node.left)
+        right = self.compile(node.right)
+        op = operations.get(node.op)
+        mat_op = mat_operations.get(node.op)
+
+        if node.operand_types is not None:
+            # the TypeChecker vouches for which operands may be matrices
+            operation = mat_op if 'vector' in node.operand_types else op
+            return lambda: operation(left(), right())
+
+        def bin_expr():
+            r1 = left()
+            r2 = right()
+            if isinstance(r1, Matrix) or isinstance(r2, Matrix):
+                return mat_op(r1, r2)
+            return op(r1, r2)
+        return bin_expr
+
+
+    @when(AST.FusedExpr)
+    def compile(self, node: AST.FusedExpr):
+        operands = [self.compile(operand) for operand in node.operands]
+        code = node.code
+        return lambda: fused_expr(code, [operand() for operand in operands])
+
+
+    @when(AST.UnaryExpr)
+    def compile(self, node: AST.UnaryExpr):
+        value = self.compile(node.value)
+        if node.op == '-':
+            return lambda: -value()
+        elif node.op == 'TRANSPOSE':
+            transpose = mat_unary_operations[node.op]
+            return lambda: transpose(value())
+        return lambda: None
+
+
+    @when(AST.Vector)
+    def compile(self, node: AST.Vector):
+        values = [self.compile(value) for value in node.values]
+        elements_type = node.elements_type
+        return lambda: Matrix.from_values([value() for value in values], elements_type)
+
+
+    @when(AST.FunctionCall)
+    def compile(self, node: AST.FunctionCall):
+        function = mat_functions[node.name]
+        args = [self.compile(arg) for arg in node.args]
+        return lambda: function(*[arg() for arg in args])
+
+
+    @when(AST.Assignment)
+    def compile(self, node: AST.Assignment):
+        value = self.compile(node.value)
+
+        if node.instr != '=':
+            value = self.compound(node, value)
+
+        if isinstance(node.ref, AST.Variable):
+            frames = self.memory.frames
+            depth, slot = node.ref.depth, node.ref.slot
+
+            def assignment():
+                new_value = value()
+                if isinstance(new_value, Matrix):
+                    new_value = new_value.share()
+                frames[depth][slot] = new_value
+        else:
+            variable = self.compile(node.ref.variable)
+            indices = [self.compile(index) for index in node.ref.indices]
+
+            def assignment():
+                new_value = value()
+                variable()[tuple(index() for index in indices)] = new_value
+        return assignment
+
+
+    def compound(self, node: AST.Assignment, value):
+        old_value = self.compile(node.ref)
+        op = operations[node.instr[0]]
+        mat_op = mat_operations[node.instr[0]]
+
+        if node.operand_types is not None:
+            operation = mat_op if node.operand_types[0] == 'vector' else op
+            return lambda: operation(old_value(), value())
+
+        def compound():
+            old = old_value()
+            if isinstance(old, Matrix):
+                return mat_op(old, value())
+            return op(old, value())
+        return compound
+
+
+    @when(AST.ReturnInstr)
+    def compile(self, node: AST.ReturnInstr):
+        value = self.compile(node.value)
+
+        def return_instr():
+            self.return_value = value()
+            return RETURN
+        return return_instr
+
+
+    @when(AST.SpecialInstr)
+    def compile(self, node: AST.SpecialInstr):
+        signal = CONTINUE if node.name == 'continue' else BREAK
+        return lambda: signal
+
+
+    @when(AST.IfElseInstr)
+    def compile(self, node: AST.IfElseInstr):
+        condition = self.compile(node.condition)
+        then_block = self.scoped(self.compile(node.then_block), node.then_frame_size)
+        else_block = None
+        if node.else_block:
+            else_block = self.scoped(self.compile(node.else_block), node.else_frame_size)
+
+        def if_else_instr():
+            if condition():
+                return then_block()
+            elif else_block:
+                return else_block()
+        return if_else_instr
+
+
+    @when(AST.PrintInstr)
+    def compile(self, node: AST.PrintInstr):
+        args = [self.compile(arg) for arg in node.args]
+
+        def print_instr():
+            for arg in args:
+                value = arg()
+                if isinstance(value, Matrix) and len(value.shape) == 2:
+                    print('\n[\n  ', end='')
+                    print(*value.tolist(), sep='\n  ')
+                    print(']')
+                else:
+                    print(value, end=' ')
+            print('')
+        return print_instr
+
+
+    @when(AST.ForLoop)
+    def compile(self, node: AST.ForLoop):
+        frames = self.memory.frames
+        var_range = self.compile(node.var_range)
+        block = self.compile(node.block)
+        depth, slot = node.variable.depth, node.variable.slot
+        hoisted, global_frame = node.hoisted, frames[0]
+
+        def for_loop():
+            bounds = var_range()
+            for h in hoisted:
+                global_frame[h] = None
+            for i in range(bounds.start, bounds.stop + 1):
+                frames[depth][slot] = i
+                signal = block()
+                if signal == BREAK:
+                    break
+                if signal == RETURN:
+                    return RETURN
+        return self.scoped(for_loop, node.frame_size)
+
+
+    @when(AST.VectorizedLoop)
+    def compile(self, node: AST.VectorizedLoop):
+        memory, frames = self.memory, self.memory.frames
+        loops = [(self.compile(loop.var_range), loop.frame_size, loop.variable.depth, loop.variable.slot)
+                 for loop in node.loops]
+        assignment = self.compile(node.assignment)
+
+        def vectorized_loop():
+            pushed = 0
+            try:
+                slices = []
+                for var_range, frame_size, _, _ in loops:
+                    bounds = var_range()
+                    if bounds.start > bounds.stop:
+                        break
+                    if frame_size:
+                        memory.push(frame_size)
+                        pushed += 1
+                    slices.append(slice(bounds.start, bounds.stop + 1))
+                else:
+                    for (_, _, depth, slot), s in zip(loops, slices):
+                        frames[depth][slot] = s
+                    assignment()
+
+                for (_, _, depth, slot), s in zip(loops, slices):
+                    frames[depth][slot] = s.stop - 1
+            finally:
+                for _ in range(pushed):
+                    memory.pop()
+        return vectorized_loop
+
+
+    @when(AST.WhileLoop)
+    def compile(self, node: AST.WhileLoop):
+        condition = self.compile(node.condition)
+        block = self.compile(node.block)
+        hoisted, global_frame = node.hoisted, self.memory.frames[0]
+
+        def while_loop():
+            for h in hoisted:
+                global_frame[h] = None
+            while condition():
+                signal = block()
+                if signal == BREAK:
+                    break
+                if signal == RETURN:
+                    return RETURN
+        return self.scoped(while_loop, node.frame_size)
+
+
+    @when(AST.Hoisted)
+    def compile(self, node: AST.Hoisted):
+        value = self.compile(node.value)
+        global_frame, slot = self.memory.frames[0], node.slot
+
+        def hoisted():
+            cached = global_frame[slot]
+            if cached is None:
+                cached = global_frame[slot] = value()
+            return cached
+        return hoisted
+
+
+    @when(AST.Program)
+    def compile(self, node: AST.Program):
+        instructions = []
+
+        for instruction in node.instructions:
+            code = self.compile(instruction)
+            if isinstance(instruction, AST.Program):
+                code = self.scoped(code, instruction.frame_size)
+            instructions.append(code)
+
+        def program():
+            for instruction in instructions:
+                signal = instruction()
+                if signal is not None:
+                    return signal
+        return program
+
+
+    def scoped(self, code, frame_size: int):
+        # scopes that declare nothing get no frame of their own
+        if not frame_size:
+            return code
+
+        memory = self.memory
+
+        def scoped():
+            memory.push(frame_size)
+            try:
+                return code()
+            finally:
+                memory.pop()
+        return scoped
@@ -1,304 +1,544 @@
-import AST
-import symbol_table
-from memory import Memory, MemoryStack
-from exceptions import BreakException, ContinueException, ReturnValueException
-from visit import on, when
-from functools import partial
-import sys
-
-
-sys.setrecursionlimit(10000)
-
-operations = {
-    '+': lambda a, b: a + b,
-    '-': lambda a, b: a - b,
-    '*': lambda a, b: a * b,
-    '/': lambda a, b: a / b,
-    '<': lambda a, b: a < b,
-    '<=': lambda a, b: a <= b,
-    '>': lambda a, b: a > b,
-    '>=': lambda a, b: a >= b,
-    '==': lambda a, b: a == b,
-    '!=': lambda a, b: a != b,
-}
-
-
-def mat_elements_op(a, b, op: str):
-    a_rows = len(a)
-    a_cols = len(a[0]) if isinstance(a[0], list) else 1
-    b_rows = len(b)
-    b_cols = len(b[0]) if isinstance(b[0], list) else 1
-
-    if a_rows != b_rows or a_cols != b_cols:
-        raise RuntimeError(f"Wrong dimensions in matrix elementwise '{op}' operation")
-
-    f = operations[op]
-    if a_cols == b_cols == 1:
-        return [f(a[i], b[i]) for i in range(a_rows)]
-    return [[f(a[i][j], b[i][j]) for j in range(a_cols)] for i in range(a_rows)]
-
-
-def mat_add(a, b):
-    if isinstance(a, list) and isinstance(b, list):
-        return mat_elements_op(a, b, '+')
-
-    if not isinstance(a, list):
-        a, b = b, a
-        
-    return [[v + b for v in row] for row in a]
-
-
-def mat_mul(a, b):
-    a_rows = len(a)
-    b_cols = len(b[0])
-
-    if a_rows != b_cols:
-        raise RuntimeError('Wrong dimensions in matrix multiplication')
-
-    res = [[0] * b_cols for _ in range(a_rows)]
-
-    for i in range(a_rows):
-        for j in range(b_cols):
-            s = 0
-            for k in range(len(b)):
-                s += a[i][k] * b[k][j]
-            res[i][j] = s
-
-    return res
-
-
-mat_operations = {
-    '+': lambda a, b: mat_add(a, b),
-    '-': lambda a, b: mat_elements_op(a, b, '-'),
-    '*': lambda a, b: mat_mul(a, b),
-    '==': lambda a, b: a == b,
-    '!=': lambda a, b: a != b,
-    '.+': lambda a, b: mat_elements_op(a, b, '+'),
-    '.+': lambda a, b: mat_elements_op(a, b, '+'),
-    '.-': lambda a, b: mat_elements_op(a, b, '-'),
-    '.*': lambda a, b: mat_elements_op(a, b, '*'),
-    './': lambda a, b: mat_elements_op(a, b, '/'),
-}
-
-
-def mat_fill(value: float, n: int, m: int = None):
-    return [[value] * (m if m else n) for _ in range(n)]
-
-
-mat_functions = {
-    'eye': lambda n: [[1.0 if i == j else 0.0 for j in range(n)] for i in range(n)],
-    'zeros': partial(mat_fill, 0.0),
-    'ones': partial(mat_fill, 1.0)
-}
-
-
-class Interpreter(object):
-    memory: MemoryStack = MemoryStack('global')
-
-    @on('node')
-    def visit(self, node):
-        pass
-
-
-    @when(AST.IntNum)
-    def visit(self, node: AST.IntNum):
-        return node.value
-
-        
-    @when(AST.FloatNum)
-    def visit(self, node: AST.FloatNum):
-        return node.value
-
-
-    @when(AST.Variable)
-    def visit(self, node: AST.Variable):
-        return self.memory.get(node.name)
-
-
-    @when(AST.String)
-    def visit(self, node: AST.String):
-        return node.value
-
-
-    @when(AST.Ref)
-    def visit(self, node: AST.Ref):
-        variable: list = node.variable.accept(self)
-
-        for index in node.indices:
-            variable = variable[index.accept(self)]
-
-        return variable
-
-
-    @when(AST.Range)
-    def visit(self, node: AST.Range):
-        start = node.start.accept(self)
-        end = node.end.accept(self)
-        return start, end
-
-
-    @when(AST.BinExpr)
-    def visit(self, node: AST.BinExpr):
-        r1 = node.left.accept(self)
-        r2 = node.right.accept(self)
-
-        if isinstance(r1, list) or isinstance(r2, list):
-            return mat_operations[node.op](r1, r2)
-
-        return operations[node.op](r1, r2)
-
-
-    @when(AST.UnaryExpr)
-    def visit(self, node: AST.UnaryExpr):
-        value = node.value.accept(self)
-        if node.op == '-':
-            return -value
-        elif node.op == 'TRANSPOSE':
-            # node.dims describe dimensions after the transpose operation 
-            if node.dims[1] == 1:
-                return [[elem] for elem in value]
-            elif node.dims[0] == 1:
-                return [elem[0] for elem in value]
-            else:
-                return [[new_row[i] for new_row in value] for i in range(node.dims[0])] # node.dims[0] = len(value[0])
-
-
-    @when(AST.Vector)
-    def visit(self, node: AST.Vector):
-        vector = []
-
-        for value in node.values:
-            vector.append(value.accept(self))
-
-        return vector
-
-
-    @when(AST.FunctionCall)
-    def visit(self, node: AST.FunctionCall):
-        args = [arg.accept(self) for arg in node.args]
-        return mat_functions[node.name](*args)
-
-
-    @when(AST.Assignment)
-    def visit(self, node: AST.Assignment):
-        value = node.value.accept(self)
-
-        if node.instr != '=':
-            old_value = node.ref.accept(self)
-            op = node.instr[0]
-            if isinstance(old_value, list):
-                value = mat_operations[op](old_value, value)
-            else:
-                value = operations[op](old_value, value)
-
-        if isinstance(node.ref, AST.Variable):
-            self.memory.set(node.ref.name, value)
-        elif isinstance(node.ref, AST.Ref):
-            variable = node.ref.variable.accept(self)
-
-            for index in node.ref.indices[:-1]:
-                variable = variable[index.accept(self)]
-
-            variable[node.ref.indices[-1].accept(self)] = value
-
-
-    @when(AST.ReturnInstr)
-    def visit(self, node: AST.ReturnInstr):
-        raise ReturnValueException(node.value.accept(self))
-
-
-    @when(AST.SpecialInstr)
-    def visit(self, node: AST.SpecialInstr):
-        if node.name == 'continue':
-            raise ContinueException()
-        elif node.name == 'break':
-            raise BreakException()
-
-
-    @when(AST.IfElseInstr)
-    def visit(self, node: AST.IfElseInstr):
-        if node.condition.accept(self):
-            self.memory.push('if_then')
-            try:
-                node.then_block.accept(self)
-            finally:
-                self.memory.pop()
-        elif node.else_block:
-            self.memory.push('if_else')
-            try:
-                node.else_block.accept(self)
-            finally:
-                self.memory.pop()
-
-
-    @when(AST.PrintInstr)
-    def visit(self, node: AST.PrintInstr):
-        for arg in node.args:
-            value = arg.accept(self)
-            if isinstance(value, list) and isinstance(value[0], list):
-                print('\n[\n  ', end='')
-                print(*value, sep='\n  ')
-                print(']')
-            else:
-                print(arg.accept(self), end=' ')
-        print('')
-
-
-    @when(AST.ForLoop)
-    def visit(self, node: AST.ForLoop):
-        start, end = node.var_range.accept(self)
-        self.memory.push('for_loop')
-
-        try:
-            for i in range(start, end+1):
-                self.memory.set(node.variable.name, i)
-                try:
-                    node.block.accept(self)
-                except ContinueException as _:
-                    continue
-                except BreakException as _:
-                    break
-        finally:
-            self.memory.pop()
-
-
-    @when(AST.WhileLoop)
-    def visit(self, node: AST.WhileLoop):
-        self.memory.push('while_loop')
-
-        try:
-            while node.condition.accept(self):
-                try:
-                    node.block.accept(self)
-                except ContinueException as _:
-                    continue
-                except BreakException as _:
-                    break
-
-        finally:
-            self.memory.pop()
-
-
-    @when(AST.Program)
-    def visit(self, node: AST.Program, toplevel=False):
-        try:
-            for instruction in node.instructions:
-                if isinstance(instruction, AST.Program):
-                    self.memory.push('block')
-                    try:
-                        instruction.accept(self)
-                    finally:
-                        self.memory.pop()
-                else:
-                    instruction.accept(self)
-        except ReturnValueException as e:
-            if toplevel:
-                print(f'Program exited with value {e.value}')
-            else:
-                raise e
-
-
-    @when(AST.Error)
-    def visit(self, node: AST.Error):
-        pass
-
+import AST
+import symbol_table
+from memory import FrameStack
+from matrix import Matrix, fused_layout, make_array, result_typecode, transpose_data
+from visit import on, when
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from array import array
+import operator
+import os
+import sys
+
+
+sys.setrecursionlimit(10000)
+
+# completion signals returned by instructions; None means normal completion
+BREAK = 1
+CONTINUE = 2
+RETURN = 3
+
+operations = {
+    '+': operator.add,
+    '-': operator.sub,
+    '*': operator.mul,
+    '/': operator.truediv,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    '==': operator.eq,
+    '!=': operator.ne,
+}
+
+
+def mat_elements_op(a: Matrix, b: Matrix, op: str):
+    if not isinstance(a, Matrix) or not isinstance(b, Matrix):
+        return mat_scalar_op(a, b, op)
+    if a.dims != b.dims:
+        raise RuntimeError(f"Wrong dimensions in matrix elementwise '{op}' operation")
+
+    code = 'd' if op == '/' else result_typecode(a.typecode, b.typecode)
+    return Matrix(a.shape, make_array(code, map(operations[op], a.data, b.data)))
+
+
+def mat_scalar_op(a, b, op: str):
+    # one operand is a scalar, applied to every element of the other
+    fn = operations[op]
+    if isinstance(a, Matrix):
+        matrix, scalar, values = a, b, [fn(v, b) for v in a.data]
+    else:
+        matrix, scalar, values = b, a, [fn(a, v) for v in b.data]
+
+    code = 'd' if op == '/' or isinstance(scalar, float) else matrix.typecode
+    return Matrix(matrix.shape, make_array(code, values))
+
+
+def mat_add(a, b):
+    if isinstance(a, Matrix) and isinstance(b, Matrix):
+        return mat_elements_op(a, b, '+')
+    return mat_scalar_op(a, b, '+')
+
+
+MATMUL_BLOCK = 64
+MATMUL_WORKERS = int(os.environ.get('MATMUL_WORKERS', os.cpu_count() or 1))
+# products with at least this many multiply-adds split their rows over worker processes
+MATMUL_PARALLEL_THRESHOLD = int(os.environ.get('MATMUL_PARALLEL_THRESHOLD', 4_000_000))
+
+matmul_pool: ProcessPoolExecutor | None = None
+
+
+def mat_mul_rows(a_data: array, inner: int, bt_data: array, b_cols: int, code: str):
+    # bt_data is the transposed right operand, so both operands are read row by row
+    rows = [a_data[i:i + inner] for i in range(0, len(a_data), inner)]
+    columns = [bt_data[j:j + inner] for j in range(0, len(bt_data), inner)]
+    res = array(code, bytes(8 * len(rows) * b_cols))
+    mul = operator.mul
+
+    for i0 in range(0, len(rows), MATMUL_BLOCK):
+        for j0 in range(0, b_cols, MATMUL_BLOCK):
+            block_columns = columns[j0:j0 + MATMUL_BLOCK]
+            for i in range(i0, min(i0 + MATMUL_BLOCK, len(rows))):
+                row = rows[i]
+                start = i * b_cols + j0
+                res[start:start + len(block_columns)] = array(
+                    code, [sum(map(mul, row, column)) for column in block_columns])
+
+    return res
+
+
+def mat_mul_data(a_data: array, a_rows: int, inner: int, bt_data: array, b_cols: int, code: str):
+    global matmul_pool
+
+    if MATMUL_WORKERS < 2 or a_rows < 2 or a_rows * inner * b_cols < MATMUL_PARALLEL_THRESHOLD:
+        return mat_mul_rows(a_data, inner, bt_data, b_cols, code)
+
+    if matmul_pool is None:
+        matmul_pool = ProcessPoolExecutor(MATMUL_WORKERS)
+
+    chunk = -(-a_rows // MATMUL_WORKERS)
+    parts = [matmul_pool.submit(mat_mul_rows, a_data[i * inner:(i + chunk) * inner], inner, bt_data, b_cols, code)
+             for i in range(0, a_rows, chunk)]
+    res = array(code)
+    for part in parts:
+        res.extend(part.result())
+
+    return res
+
+
+def mat_mul(a: Matrix, b: Matrix):
+    a_rows, inner = a.dims
+    b_rows, b_cols = b.dims
+
+    if inner != b_rows:
+        raise RuntimeError('Wrong dimensions in matrix multiplication')
+
+    code = result_typecode(a.typecode, b.typecode)
+    bt_data = transpose_data(b.data, b_rows, b_cols)
+
+    try:
+        return Matrix((a_rows, b_cols), mat_mul_data(a.data, a_rows, inner, bt_data, b_cols, code))
+    except OverflowError:
+        if code != 'q':
+            raise
+        # like the elementwise operations, an integer product past 64 bits is widened to floats
+        return Matrix((a_rows, b_cols), mat_mul_data(a.data, a_rows, inner, bt_data, b_cols, 'd'))
+
+
+ELEMENTWISE = ('.+', '.-', '.*', './', '+', '-')   # matrix operators a FusedExpr can chain
+
+
+fused_kernels = {}
+
+
+def fused_kernel(code: tuple):
+    # one Python function per chain shape, computing a result element from the operand elements
+    kernel = fused_kernels.get(code)
+    if kernel is None:
+        stack = []
+        for item in code:
+            if isinstance(item, int):
+                stack.append(f'x{item}')
+            else:
+                b, a = stack.pop(), stack.pop()
+                stack.append(f'({a} {item[-1]} {b})')
+        arguments = ', '.join(f'x{i}' for i in range(sum(isinstance(item, int) for item in code)))
+        kernel = fused_kernels[code] = eval(f'lambda {arguments}: {stack.pop()}')
+    return kernel
+
+
+def mat_fused(code: tuple, operands: list[Matrix]):
+    shape, typecode = fused_layout(code, operands)
+    return Matrix(shape, make_array(typecode, map(fused_kernel(code), *(operand.data for operand in operands))))
+
+
+def fused_expr(code: tuple, operands: list):
+    """Evaluates a FusedExpr chain over its already evaluated operands."""
+    if all(isinstance(operand, Matrix) for operand in operands):
+        return mat_operations['fused'](code, operands)
+
+    # an operand the TypeChecker took for a matrix is a scalar: one operation at a time, as written
+    stack = []
+    for item in code:
+        if isinstance(item, int):
+            stack.append(operands[item])
+        else:
+            b, a = stack.pop(), stack.pop()
+            if isinstance(a, Matrix) or isinstance(b, Matrix):
+                stack.append(mat_operations[item](a, b))
+            else:
+                stack.append(operations[item](a, b))
+    return stack.pop()
+
+
+def mat_eye_mul(a: Matrix, n: int, axis: int):
+    # eye(n) * a (axis 0) and a * eye(n) (axis 1) are a float copy of an integer a, once n is checked like in mat_mul;
+    # a float a is multiplied, the product turns 0.0 * inf into nan and -0.0 into 0.0
+    if a.dims[axis] != n:
+        raise RuntimeError('Wrong dimensions in matrix multiplication')
+    if a.typecode != 'q':
+        return mat_mul(mat_eye(n), a) if axis == 0 else mat_mul(a, mat_eye(n))
+    return Matrix(a.dims, array('d', a.data))
+
+
+mat_operations = {
+    '+': lambda a, b: mat_add(a, b),
+    '-': lambda a, b: mat_elements_op(a, b, '-'),
+    '*': lambda a, b: mat_mul(a, b),
+    '==': lambda a, b: a == b,
+    '!=': lambda a, b: a != b,
+    '.+': lambda a, b: mat_elements_op(a, b, '+'),
+    '.-': lambda a, b: mat_elements_op(a, b, '-'),
+    '.*': lambda a, b: mat_elements_op(a, b, '*'),
+    './': lambda a, b: mat_elements_op(a, b, '/'),
+    'eye*': lambda n, a: mat_eye_mul(a, n, 0),   # only produced by the Optimizer
+    '*eye': lambda a, n: mat_eye_mul(a, n, 1),
+    'fused': mat_fused,
+}
+
+
+def mat_fill(value: float, n: int, m: int = None):
+    return Matrix.filled(value, n, m if m else n)
+
+
+def mat_eye(n: int):
+    res = Matrix.filled(0.0, n, n)
+    res.data[::n + 1] = array('d', [1.0]) * n
+    return res
+
+
+mat_functions = {
+    'eye': mat_eye,
+    'zeros': partial(mat_fill, 0.0),
+    'ones': partial(mat_fill, 1.0)
+}
+
+
+mat_unary_operations = {
+    'TRANSPOSE': lambda a: a.transpose(),
+}
+
+
+python_backend = (dict(mat_operations), dict(mat_functions), dict(mat_unary_operations))
+backend = 'python'   # the backend the tables hold, as use_backend resolved it
+
+
+# ------- OPERATORS BOUND TO NODES -------
+# matrix operations are looked up on every call, so a bound node follows use_backend
+
+
+def matrix_operation(op: str, a, b):
+    return mat_operations[op](a, b)
+
+
+def matrix_unary_operation(op: str, a):
+    return mat_unary_operations[op](a)
+
+
+def any_operation(op: str, a, b):
+    if isinstance(a, Matrix) or isinstance(b, Matrix):
+        return mat_operations[op](a, b)
+    return operations[op](a, b)
+
+
+def compound_operation(op: str, old, value):
+    if isinstance(old, Matrix):
+        return mat_operations[op](old, value)
+    return operations[op](old, value)
+
+
+def bind_operator(node: AST.BinExpr | AST.UnaryExpr | AST.Assignment):
+    """Returns the function computing node's operation, specialized on its operand_types.
+
+    Operands checked as numbers or strings get Python's operator, the ones
+    with a matrix the backend's operation. Without operand_types the values
+    are tested on every call, as the TypeChecker could not vouch for them.
+    """
+    types = node.operand_types
+    if isinstance(node, AST.UnaryExpr):
+        return operator.neg if node.op == '-' else partial(matrix_unary_operation, node.op)
+    if isinstance(node, AST.Assignment):
+        # like the values, the old one alone decides
+        op = node.instr[0]
+        if types is None:
+            return partial(compound_operation, op)
+        return partial(matrix_operation, op) if types[0] == 'vector' else operations[op]
+    if types is None:
+        return partial(any_operation, node.op)
+    return partial(matrix_operation, node.op) if 'vector' in types else operations[node.op]
+# ----------------------------------------
+
+
+def use_backend(name: str):
+    """Routes matrix operations through the 'python' or 'numpy' backend.
+
+    'auto' picks NumPy when it is installed; asking for NumPy without it
+    installed falls back to the pure-Python kernels with a warning.
+    """
+    global backend
+    tables, backend = python_backend, 'python'
+
+    if name in ('auto', 'numpy'):
+        import numpy_backend
+        if numpy_backend.numpy is not None:
+            tables = (numpy_backend.mat_operations, numpy_backend.mat_functions,
+                      numpy_backend.mat_unary_operations)
+            backend = 'numpy'
+        elif name == 'numpy':
+            print('NumPy is not installed, using the python matrix backend', file=sys.stderr)
+
+    for table, implementation in zip((mat_operations, mat_functions, mat_unary_operations), tables):
+        table.clear()
+        table.update(implementation)
+
+
+class Interpreter(object):
+    memory: FrameStack = FrameStack()
+    return_value = None
+
+    @on('node')
+    def visit(self, node):
+        pass
+
+
+    @when(AST.IntNum)
+    def visit(self, node: AST.IntNum):
+        return node.value
+
+        
+    @when(AST.FloatNum)
+    def visit(self, node: AST.FloatNum):
+        return node.value
+
+
+    @when(AST.Variable)
+    def visit(self, node: AST.Variable):
+        return self.memory.get(node.depth, node.slot)
+
+
+    @when(AST.String)
+    def visit(self, node: AST.String):
+        return node.value
+
+
+    @when(AST.Ref)
+    def visit(self, node: AST.Ref):
+        variable: Matrix = node.variable.accept(self)
+        return variable[tuple(index.accept(self) for index in node.indices)]
+
+
+    @when(AST.Range)
+    def visit(self, node: AST.Range):
+        start = node.start.accept(self)
+        end = node.end.accept(self)
+        return slice(start, end)
+
+
+    @when(AST.BinExpr)
+    def visit(self, node: AST.BinExpr):
+        r1 = node.left.accept(self)
+        r2 = node.right.accept(self)
+        operation = node.operator or self.bind(node)
+        return operation(r1, r2)
+
+
+    @when(AST.FusedExpr)
+    def visit(self, node: AST.FusedExpr):
+        return fused_expr(node.code, [operand.accept(self) for operand in node.operands])
+
+
+    @when(AST.UnaryExpr)
+    def visit(self, node: AST.UnaryExpr):
+        value = node.value.accept(self)
+        operation = node.operator or self.bind(node)
+        return operation(value)
+
+
+    @when(AST.Vector)
+    def visit(self, node: AST.Vector):
+        values = [value.accept(self) for value in node.values]
+        return Matrix.from_values(values, node.elements_type)
+
+
+    @when(AST.FunctionCall)
+    def visit(self, node: AST.FunctionCall):
+        args = [arg.accept(self) for arg in node.args]
+        return mat_functions[node.name](*args)
+
+
+    @when(AST.Assignment)
+    def visit(self, node: AST.Assignment):
+        value = node.value.accept(self)
+
+        if node.instr != '=':
+            old_value = node.ref.accept(self)
+            operation = node.operator or self.bind(node)
+            value = operation(old_value, value)
+
+        if isinstance(node.ref, AST.Variable):
+            if isinstance(value, Matrix):
+                # the value may be another variable's matrix, they only share it until one is written
+                value = value.share()
+            self.memory.set(node.ref.depth, node.ref.slot, value)
+        elif isinstance(node.ref, AST.Ref):
+            variable: Matrix = node.ref.variable.accept(self)
+            variable[tuple(index.accept(self) for index in node.ref.indices)] = value
+
+
+    @when(AST.ReturnInstr)
+    def visit(self, node: AST.ReturnInstr):
+        self.return_value = node.value.accept(self)
+        return RETURN
+
+
+    @when(AST.SpecialInstr)
+    def visit(self, node: AST.SpecialInstr):
+        if node.name == 'continue':
+            return CONTINUE
+        elif node.name == 'break':
+            return BREAK
+
+
+    @when(AST.IfElseInstr)
+    def visit(self, node: AST.IfElseInstr):
+        if node.condition.accept(self):
+            return self.scoped(node.then_block, node.then_frame_size)
+        elif node.else_block:
+            return self.scoped(node.else_block, node.else_frame_size)
+
+
+    @when(AST.PrintInstr)
+    def visit(self, node: AST.PrintInstr):
+        for arg in node.args:
+            value = arg.accept(self)
+            if isinstance(value, Matrix) and len(value.shape) == 2:
+                print('\n[\n  ', end='')
+                print(*value.tolist(), sep='\n  ')
+                print(']')
+            else:
+                print(value, end=' ')
+        print('')
+
+
+    @when(AST.ForLoop)
+    def visit(self, node: AST.ForLoop):
+        bounds = node.var_range.accept(self)
+        depth, slot = node.variable.depth, node.variable.slot
+        self.clear_hoisted(node.hoisted)
+        if node.frame_size:
+            self.memory.push(node.frame_size)
+
+        try:
+            for i in range(bounds.start, bounds.stop + 1):
+                self.memory.set(depth, slot, i)
+                signal = node.block.accept(self)
+                if signal == BREAK:
+                    break
+                if signal == RETURN:
+                    return RETURN
+        finally:
+            if node.frame_size:
+                self.memory.pop()
+
+
+    @when(AST.VectorizedLoop)
+    def visit(self, node: AST.VectorizedLoop):
+        frames = 0
+        try:
+            slices = []
+            for loop in node.loops:
+                bounds = loop.var_range.accept(self)
+                # like the loops, an empty range runs nothing, the ranges inside it included
+                if bounds.start > bounds.stop:
+                    break
+                if loop.frame_size:
+                    self.memory.push(loop.frame_size)
+                    frames += 1
+                slices.append(slice(bounds.start, bounds.stop + 1))
+            else:
+                for loop, s in zip(node.loops, slices):
+                    self.memory.set(loop.variable.depth, loop.variable.slot, s)
+                node.assignment.accept(self)
+
+            # the loops that ran leave their variables at the last value, as they do
+            for loop, s in zip(node.loops, slices):
+                self.memory.set(loop.variable.depth, loop.variable.slot, s.stop - 1)
+        finally:
+            for _ in range(frames):
+                self.memory.pop()
+
+
+    @when(AST.WhileLoop)
+    def visit(self, node: AST.WhileLoop):
+        self.clear_hoisted(node.hoisted)
+        if node.frame_size:
+            self.memory.push(node.frame_size)
+
+        try:
+            while node.condition.accept(self):
+                signal = node.block.accept(self)
+                if signal == BREAK:
+                    break
+                if signal == RETURN:
+                    return RETURN
+
+        finally:
+            if node.frame_size:
+                self.memory.pop()
+
+
+    @when(AST.Program)
+    def visit(self, node: AST.Program, toplevel=False):
+        if toplevel:
+            self.memory = FrameStack(node.frame_size)
+
+        for instruction in node.instructions:
+            if isinstance(instruction, AST.Program):
+                signal = self.scoped(instruction, instruction.frame_size)
+            else:
+                signal = instruction.accept(self)
+
+            if signal is not None:
+                if toplevel and signal == RETURN:
+                    print(f'Program exited with value {self.return_value}')
+                    return None
+                return signal
+
+
+    @when(AST.Hoisted)
+    def visit(self, node: AST.Hoisted):
+        value = self.memory.get(0, node.slot)
+        if value is None:
+            value = node.value.accept(self)
+            self.memory.set(0, node.slot, value)
+        return value
+
+
+    @when(AST.Error)
+    def visit(self, node: AST.Error):
+        pass
+
+
+    def bind(self, node: AST.BinExpr | AST.UnaryExpr | AST.Assignment):
+        # once per node, the runs after it call the operator straight away
+        node.operator = bind_operator(node)
+        return node.operator
+
+
+    def clear_hoisted(self, slots: list[int]):
+        # values hoisted out of a loop are computed again, on first use, each time it starts
+        for slot in slots:
+            self.memory.set(0, slot, None)
+
+
+    def scoped(self, node: AST.Node, frame_size: int):
+        # scopes that declare nothing get no frame of their own
+        if not frame_size:
+            return node.accept(self)
+
+        self.memory.push(frame_size)
+        try:
+            return node.accept(self)
+        finally:
+            self.memory.pop()
+
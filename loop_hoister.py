@@ -0,0 +1,216 @@
+import AST
+from visit import on, when
+
+
+class LoopHoister(object):
+    """Moves loop-invariant expressions out of ForLoop and WhileLoop bodies.
+
+    An expression is invariant in a loop when no variable it reads is assigned
+    anywhere in the loop, its own loop variable included; assigning an element
+    assigns the matrix variable. Variables are told apart by the (depth, slot)
+    the TypeChecker resolved them to. Matrices are values (copy-on-write), so
+    no other variable sees the assigned elements.
+
+    The largest invariant BinExpr, UnaryExpr, FunctionCall, Vector and
+    FusedExpr subtrees become AST.Hoisted nodes, hoisted out of the outermost loop they
+    are invariant in. A Hoisted node computes its value on first use after
+    the loop starts and keeps it in a slot added to the global frame, so a
+    loop that never reaches the expression evaluates nothing, as before.
+    """
+
+    def __init__(self):
+        self.program: AST.Program | None = None
+        self.loops = []     # enclosing loops, outermost first: (loop, assigned (depth, slot) keys)
+
+
+    @on('node')
+    def visit(self, node):
+        return node
+
+
+    @when(AST.Ref)
+    def visit(self, node: AST.Ref):
+        node.indices = [self.visit(index) for index in node.indices]
+        return node
+
+
+    @when(AST.Range)
+    def visit(self, node: AST.Range):
+        node.start = self.visit(node.start)
+        node.end = self.visit(node.end)
+        return node
+
+
+    @when(AST.BinExpr)
+    def visit(self, node: AST.BinExpr):
+        return self.hoist(node)
+
+
+    @when(AST.UnaryExpr)
+    def visit(self, node: AST.UnaryExpr):
+        return self.hoist(node)
+
+
+    @when(AST.Vector)
+    def visit(self, node: AST.Vector):
+        return self.hoist(node)
+
+
+    @when(AST.FusedExpr)
+    def visit(self, node: AST.FusedExpr):
+        return self.hoist(node)
+
+
+    @when(AST.FunctionCall)
+    def visit(self, node: AST.FunctionCall):
+        return self.hoist(node)
+
+
+    @when(AST.Assignment)
+    def visit(self, node: AST.Assignment):
+        node.value = self.visit(node.value)
+        node.ref = self.visit(node.ref)
+        return node
+
+
+    @when(AST.ReturnInstr)
+    def visit(self, node: AST.ReturnInstr):
+        node.value = self.visit(node.value)
+        return node
+
+
+    @when(AST.PrintInstr)
+    def visit(self, node: AST.PrintInstr):
+        node.args = [self.visit(arg) for arg in node.args]
+        return node
+
+
+    @when(AST.IfElseInstr)
+    def visit(self, node: AST.IfElseInstr):
+        node.condition = self.visit(node.condition)
+        node.then_block = self.visit(node.then_block)
+        if node.else_block:
+            node.else_block = self.visit(node.else_block)
+        return node
+
+
+    @when(AST.ForLoop)
+    def visit(self, node: AST.ForLoop):
+        # the range is evaluated once per start of the loop, outside of it
+        node.var_range = self.visit(node.var_range)
+
+        assigned = {(node.variable.depth, node.variable.slot)}
+        assignments(node.block, assigned)
+        self.loops.append((node, assigned))
+        node.block = self.visit(node.block)
+        self.loops.pop()
+        return node
+
+
+    @when(AST.WhileLoop)
+    def visit(self, node: AST.WhileLoop):
+        assigned = set()
+        assignments(node.block, assigned)
+        self.loops.append((node, assigned))
+        node.condition = self.visit(node.condition)
+        node.block = self.visit(node.block)
+        self.loops.pop()
+        return node
+
+
+    @when(AST.Program)
+    def visit(self, node: AST.Program):
+        if self.program is None:
+            self.program = node
+
+        node.instructions = [self.visit(instruction) for instruction in node.instructions]
+        return node
+
+
+    def hoist(self, node: AST.Node):
+        loops = self.loops
+        target = next((i for i, loop in enumerate(loops) if is_invariant(node, loop[1])), len(loops))
+
+        # parts of a hoisted expression may still be invariant in the loops around its own
+        self.loops = loops[:target]
+        try:
+            self.visit_operands(node)
+        finally:
+            self.loops = loops
+
+        if target == len(loops):
+            return node
+
+        slot = self.program.frame_size
+        self.program.frame_size += 1
+        loops[target][0].hoisted.append(slot)
+        return AST.Hoisted(node.lineno, node, slot)
+
+
+    def visit_operands(self, node: AST.Node):
+        if isinstance(node, AST.BinExpr):
+            node.left = self.visit(node.left)
+            node.right = self.visit(node.right)
+        elif isinstance(node, AST.UnaryExpr):
+            node.value = self.visit(node.value)
+        elif isinstance(node, AST.FunctionCall):
+            node.args = [self.visit(arg) for arg in node.args]
+        elif isinstance(node, AST.Vector):
+            node.values = [self.visit(value) for value in node.values]
+        elif isinstance(node, AST.FusedExpr):
+            node.operands = [self.visit(operand) for operand in node.operands]
+
+
+def is_invariant(node: AST.Node, assigned: set):
+    return all((variable.depth, variable.slot) not in assigned for variable in variables(node))
+
+
+def variables(node: AST.Node):
+    """Yields every Variable read by the expression node."""
+    if isinstance(node, AST.Variable):
+        yield node
+    elif isinstance(node, AST.Ref):
+        yield node.variable
+        for index in node.indices:
+            yield from variables(index)
+    elif isinstance(node, AST.Range):
+        yield from variables(node.start)
+        yield from variables(node.end)
+    elif isinstance(node, AST.BinExpr):
+        yield from variables(node.left)
+        yield from variables(node.right)
+    elif isinstance(node, AST.UnaryExpr):
+        yield from variables(node.value)
+    elif isinstance(node, AST.FunctionCall):
+        for arg in node.args:
+            yield from variables(arg)
+    elif isinstance(node, AST.Vector):
+        for value in node.values:
+            yield from variables(value)
+    elif isinstance(node, AST.FusedExpr):
+        for operand in node.operands:
+            yield from variables(operand)
+
+
+def assignments(node: AST.Node, assigned: set):
+    """Adds the (depth, slot) of every variable the instruction node assigns to assigned."""
+    if isinstance(node, AST.Assignment):
+        ref = node.ref.variable if isinstance(node.ref, AST.Ref) else node.ref
+        assigned.add((ref.depth, ref.slot))
+    elif isinstance(node, AST.ForLoop):
+        assigned.add((node.variable.depth, node.variable.slot))
+        assignments(node.block, assigned)
+    elif isinstance(node, AST.WhileLoop):
+        assignments(node.block, assigned)
+    elif isinstance(node, AST.VectorizedLoop):
+        # like the loops it replaces, the nest leaves each loop variable at its last value
+        for loop in node.loops:
+            assigned.add((loop.variable.depth, loop.variable.slot))
+        assignments(node.assignment, assigned)
+    elif isinstance(node, AST.IfElseInstr):
+        assignments(node.then_block, assigned)
+        if node.else_block:
+            assignments(node.else_block, assigned)
+    elif isinstance(node, AST.Program):
+        for instruction in node.instructions:
+            assignments(instruction, assigned)
@@ -1,15 +1,116 @@
 from collections import deque
+import argparse
+import os
 import sys
 import AST
 from scanner import Scanner
 from parser import Mparser
 from tree_printer import TreePrinter
 from type_checker import TypeChecker
-from interpreter import Interpreter
+from interpreter import Interpreter, use_backend
+from closure_compiler import ClosureCompiler
+from optimizer import Optimizer
+from loop_hoister import LoopHoister
+from vectorizer import Vectorizer
+import vectorizer
+from streaming import StreamRunner
+from profiler import Profiler
+import bytecode
+from vm import VM
+import transpiler
+import script_cache
+
+
+def parse_args():
+    arg_parser = argparse.ArgumentParser(description="Run a matrix script")
+    arg_parser.add_argument("filename", nargs="?", default="samples/example.txt")
+    arg_parser.add_argument("--engine", choices=["tree", "closure", "vm", "cpython"], default="tree",
+                            help="execution engine: tree-walking interpreter, compiled closures, bytecode VM "
+                                 "(.mbc files always run on the VM) or a Python module run by CPython, cached in __mcache__")
+    arg_parser.add_argument("--backend", choices=["auto", "python", "numpy"],
+                            default=os.environ.get("MATRIX_BACKEND", "auto"),
+                            help="matrix backend, 'auto' uses NumPy when installed (env: MATRIX_BACKEND)")
+    arg_parser.add_argument("--parser-debug", nargs="?", const="parser.out", metavar="FILE",
+                            help="write the grammar and LALR tables to FILE (default: parser.out)")
+    arg_parser.add_argument("--no-cache", action="store_true",
+                            help="always scan, parse and check the script instead of using __mcache__")
+    arg_parser.add_argument("--no-optimize", action="store_true",
+                            help="run the checked AST as written, without vectorization, constant folding, simplification and hoisting")
+    arg_parser.add_argument("--vectorize-report", action="store_true",
+                            help="list the for loops run as bulk matrix operations on stderr")
+    arg_parser.add_argument("--stream", action="store_true",
+                            help="memory-map the script and check and run it one top-level instruction at a time, "
+                                 "for very large scripts (no cache; instructions before an error still run; "
+                                 "the cpython engine runs them on the tree interpreter)")
+    arg_parser.add_argument("--emit-bytecode", nargs="?", const="", metavar="FILE",
+                            help="compile the script to bytecode in FILE (default: the script's name with .mbc) instead of running it")
+    arg_parser.add_argument("--profile", action="store_true",
+                            help="run the script on the tree interpreter and write the time per node type, per line "
+                                 "and per matrix operation on stderr")
+    arg_parser.add_argument("--profile-stacks", metavar="FILE",
+                            help="profile like --profile and also write the collapsed stacks for flame graph tools to FILE")
+    arg_parser.add_argument("--serve", metavar="SOCKET",
+                            help="instead of running a script, serve the scripts sent by client.py over the Unix socket SOCKET")
+    arg_parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                            help="with --serve, how many scripts run at once, each in its own process (default: one per CPU)")
+    return arg_parser.parse_args()
+
+
+def compile_source(text: str, optimize: bool = True, errors: list | None = None):
+    # returns the checked AST (None if it must not run) and whether it is worth caching;
+    # the TypeChecker's errors are also added to errors, when given
+    lexer = Scanner()
+    parser = Mparser()
+
+    ast: AST.Program = parser.parse(lexer.tokenize(text))
+
+    if ast:
+        typeChecker = TypeChecker()
+        typeChecker.visit(ast)
+        typeChecker.report_errors()
+        if errors is not None:
+            errors.extend(typeChecker.errors)
+
+        if not typeChecker.errors:
+            if optimize:
+                ast = LoopHoister().visit(Optimizer().visit(Vectorizer().visit(ast)))
+            return ast, not (lexer.had_error or parser.had_error)
+    return None, False
+
+
+def execute(ast: AST.Program, engine: str):
+    # returns the value the program exited with, None if it ran to its end
+    if engine == "cpython":
+        module = transpiler.load_source(transpiler.transpile(ast))
+        if module is not None:
+            return transpiler.run(module)
+        engine = "tree"   # nested deeper than CPython compiles
+
+    if engine == "closure":
+        runner = ClosureCompiler()
+        runner.run(ast)
+    elif engine == "vm":
+        runner = VM()
+        runner.run(bytecode.compile_program(ast))
+    else:
+        runner = Interpreter()
+        ast.accept(runner, toplevel=True)
+    return runner.return_value
 
 
 if __name__ == "__main__":
-    filename = sys.argv[1] if len(sys.argv) > 1 else "samples/example.txt"
+    args = parse_args()
+    filename = args.filename
+    use_backend(args.backend)
+
+    if args.parser_debug:
+        Mparser.write_debugfile(args.parser_debug)
+
+    if args.serve:
+        # imported here, the server's workers import this module through batch
+        import server
+        server.serve(args.serve, max(1, args.workers), args.backend)
+        sys.exit(0)
 
     try:
         file = open(filename, "r")
@@ -17,18 +118,63 @@ if __name__ == "__main__":
         print("Cannot open {0} file".format(filename))
         sys.exit(0)
 
+    optimize = not args.no_optimize
+
+    if filename.endswith(".mbc"):
+        # compiled ahead of time, nothing is left to scan, parse or check
+        file.close()
+        with open(filename, "rb") as f:
+            try:
+                code = bytecode.load(f)
+            except ValueError as e:
+                print(f"Cannot run {filename}: {e}")
+                sys.exit(1)
+        VM().run(code)
+        sys.exit(0)
+
+    if args.stream:
+        file.close()
+        StreamRunner(args.engine, optimize).run(filename, args.vectorize_report)
+        sys.exit(0)
+
     text = file.read()
 
-    lexer = Scanner()
-    parser = Mparser()
+    # a cached module needs no front end at all, unless the AST itself is asked for
+    transpile = args.engine == "cpython" and not args.no_cache
+    if transpile and not (args.vectorize_report or args.emit_bytecode is not None or args.profile or args.profile_stacks):
+        module = transpiler.load(filename, text, optimize)
+        if module is not None:
+            transpiler.run(module)
+            sys.exit(0)
 
-    ast: AST.Program = parser.parse(lexer.tokenize(text))
+    ast = None if args.no_cache else script_cache.load(filename, text, optimize)
 
-    if ast:
-        typeChecker = TypeChecker()   
-        typeChecker.visit(ast)
-        typeChecker.report_errors()
+    if ast is None:
+        ast, cacheable = compile_source(text, optimize)
+        if cacheable and not args.no_cache:
+            script_cache.store(filename, text, ast, optimize)
 
-        if not typeChecker.errors:
-            ast.accept(Interpreter(), toplevel=True)
+    if ast and args.vectorize_report:
+        for line in vectorizer.report(filename, ast):
+            print(line, file=sys.stderr)
 
+    if ast and args.emit_bytecode is not None:
+        output = args.emit_bytecode or os.path.splitext(filename)[0] + ".mbc"
+        with open(output, "wb") as f:
+            bytecode.dump(bytecode.compile_program(ast), f)
+    elif ast and (args.profile or args.profile_stacks):
+        profiler = Profiler()
+        profiler.run(ast)
+        profiler.report(sys.stderr)
+        if args.profile_stacks:
+            with open(args.profile_stacks, 'w') as f:
+                profiler.write_stacks(f)
+    elif ast and transpile:
+        source = transpiler.transpile(ast)
+        module = transpiler.store(filename, text, source, optimize) or transpiler.load_source(source)
+        if module is not None:
+            transpiler.run(module)
+        else:
+            execute(ast, "tree")
+    elif ast:
+        execute(ast, args.engine)
@@ -0,0 +1,339 @@
+from array import array
+import weakref
+
+
+def typecode(elements_type: str | None):
+    return 'q' if elements_type == 'int' else 'd'
+
+
+def result_typecode(a: str, b: str):
+    return 'q' if a == b == 'q' else 'd'
+
+
+def fused_layout(code: tuple, operands: list):
+    # shape and typecode of a fused chain, raising where the separate operations would
+    stack = []
+    for item in code:
+        if isinstance(item, int):
+            stack.append((operands[item].shape, operands[item].dims, operands[item].typecode))
+            continue
+        (_, b_dims, b_code), (a_shape, a_dims, a_code) = stack.pop(), stack.pop()
+        if a_dims != b_dims:
+            raise RuntimeError(f"Wrong dimensions in matrix elementwise '{item[-1]}' operation")
+        stack.append((a_shape, a_dims, 'd' if item == './' else result_typecode(a_code, b_code)))
+    shape, _, result_code = stack.pop()
+    return shape, result_code
+
+
+INT64 = range(-2 ** 63, 2 ** 63)   # the integers an integer buffer holds
+
+
+def make_array(code: str, values):
+    # an integer buffer is widened as soon as a float, or an integer past 64 bits, has to be stored in it
+    if code == 'q' and not isinstance(values, (list, array)):
+        values = list(values)
+    try:
+        return array(code, values)
+    except (TypeError, OverflowError):
+        return array('d', values)
+
+
+def transpose_data(data: array, rows: int, cols: int): # row-major buffer of the transposed rows x cols matrix
+    res = array(data.typecode)
+    for j in range(cols):
+        res.extend(data[j::cols])
+    return res
+
+
+class Matrix(object):
+    """Dense matrix stored as a flat, row-major `array` buffer.
+
+    shape is (n,) for a plain vector literal like [1, 2, 3] and (rows, cols)
+    for everything else; the buffer holds 'q' (int) or 'd' (float) elements.
+
+    Slices, rows and transposes are views: instead of a buffer of their own
+    they keep (owner, offset, strides) into the buffer of the matrix they were
+    taken from. A view copies its elements out (materializes) the first time
+    its `data` is needed, when it is written, and right before its owner is
+    written, so matrices keep behaving as independent values.
+
+    Assigning a matrix to a variable stores a share() of it: a new Matrix on
+    the same buffer, counted by a reference count common to all of them. The
+    first write to a buffer that is still shared copies it (copy-on-write),
+    a matrix whose other sharers are gone is written in place.
+    """
+
+    __slots__ = ('shape', '_data', 'source', 'views', 'shares', '__weakref__')
+
+    def __init__(self, shape: tuple, data: array | None):
+        self.shape = shape
+        self._data = data
+        self.source = None  # (owner, offset, strides) of an unmaterialized view
+        self.views = None   # live views over this matrix's buffer
+        self.shares = None  # [number of matrices sharing _data], None while it is not shared
+
+
+    @classmethod
+    def from_values(cls, values: list, elements_type: str | None = None):
+        code = typecode(elements_type)
+
+        if values and isinstance(values[0], Matrix):
+            width = values[0].shape[0]
+            flat = []
+            for row in values:
+                if row.shape != (width,):
+                    raise RuntimeError('Wrong dimensions in vector declaration')
+                flat.extend(row.data)
+            return cls((len(values), width), make_array(code, flat))
+
+        return cls((len(values),), make_array(code, values))
+
+
+    @classmethod
+    def filled(cls, value: float, rows: int, cols: int):
+        return cls((rows, cols), array('d', [value]) * (rows * cols))
+
+
+    @classmethod
+    def view(cls, owner: 'Matrix', offset: int, strides: tuple, shape: tuple):
+        res = cls(shape, None)
+        res.source = (owner, offset, strides)
+        if owner.views is None:
+            owner.views = weakref.WeakValueDictionary()   # by id, matrices are unhashable
+        owner.views[id(res)] = res
+        return res
+
+
+    def share(self):
+        """Returns a matrix with the same value, sharing this one's buffer until either is written."""
+        if self.source is not None:
+            return Matrix.view(*self.source, self.shape)
+
+        if self.shares is None:
+            self.shares = [1]
+        self.shares[0] += 1
+        res = Matrix(self.shape, self._data)
+        res.shares = self.shares
+        return res
+
+
+    def __del__(self):
+        if self.shares is not None:
+            self.shares[0] -= 1
+
+
+    @property
+    def data(self) -> array:
+        if self.source is not None:
+            self.materialize()
+        return self._data
+
+
+    @data.setter
+    def data(self, value: array):
+        self._data = value
+
+
+    @property
+    def dims(self): # shape with plain vectors seen as a single row, like the TypeChecker does
+        return (1, self.shape[0]) if len(self.shape) == 1 else self.shape
+
+
+    @property
+    def typecode(self):
+        return (self._data if self.source is None else self.source[0]._data).typecode
+
+
+    def layout(self): # (owner, offset, strides) locating this matrix's elements
+        if self.source is not None:
+            return self.source
+        return self, 0, (self.shape[1], 1) if len(self.shape) == 2 else (1,)
+
+
+    def materialize(self):
+        owner, offset, strides = self.source
+        base = owner._data
+        data = array(base.typecode)
+        for start, step, count in runs(offset, strides, self.shape):
+            data.extend(base[start:start + (count - 1) * step + 1:step])
+
+        self._data = data
+        self.source = None
+        owner.views.pop(id(self), None)
+
+
+    def prepare_write(self):
+        # a view gets its own buffer, views of this matrix get theirs before it changes,
+        # and a buffer other matrices still share is copied
+        if self.source is not None:
+            self.materialize()
+        if self.views:
+            for view in list(self.views.values()):
+                view.materialize()
+        if self.shares is not None and self.shares[0] > 1:
+            self.shares[0] -= 1
+            self.shares = None
+            self._data = self._data[:]
+
+
+    def offset(self, index: tuple):
+        if len(index) > len(self.shape):
+            raise RuntimeError('Access with wrong dimensions (too many indices)')
+
+        for i, size in zip(index, self.shape):
+            if not 0 <= i < size:
+                raise IndexError('matrix index out of range')
+
+        if len(self.shape) == 1:
+            return index[0]
+        if len(index) == 1:
+            return None
+        return index[0] * self.shape[1] + index[1]
+
+
+    def row(self, i: int):
+        owner, offset, strides = self.layout()
+        return Matrix.view(owner, offset + i * strides[0], strides[1:], self.shape[1:])
+
+
+    def slice(self, index: tuple):
+        """Returns the view selected by index, a tuple of ints and slices.
+
+        A slice start:stop keeps its dimension (stop excluded), an int drops it.
+        """
+        if len(index) > len(self.shape):
+            raise RuntimeError('Access with wrong dimensions (too many indices)')
+
+        owner, offset, strides = self.layout()
+        shape, view_strides = [], []
+        for i, (position, size, stride) in enumerate(zip(index, self.shape, strides)):
+            if isinstance(position, slice):
+                if not 0 <= position.start <= position.stop <= size:
+                    raise IndexError('matrix slice out of range')
+                offset += position.start * stride
+                shape.append(position.stop - position.start)
+                view_strides.append(stride)
+            else:
+                if not 0 <= position < size:
+                    raise IndexError('matrix index out of range')
+                offset += position * stride
+
+        shape.extend(self.shape[len(index):])
+        view_strides.extend(strides[len(index):])
+        return Matrix.view(owner, offset, tuple(view_strides), tuple(shape))
+
+
+    def __getitem__(self, index):
+        if not isinstance(index, tuple):
+            index = (index,)
+        if slice in map(type, index):
+            return self.slice(index)
+
+        offset = self.offset(index)
+        if offset is None:
+            return self.row(index[0])
+        if self.source is None:
+            return self._data[offset]
+
+        owner, offset, strides = self.source
+        for i, stride in zip(index, strides):
+            offset += i * stride
+        return owner._data[offset]
+
+
+    def __setitem__(self, index, value):
+        if not isinstance(index, tuple):
+            index = (index,)
+        if slice in map(type, index):
+            return self.assign_slice(index, value)
+
+        offset = self.offset(index)
+        if offset is None:
+            raise RuntimeError('Cannot assign a single value to a whole matrix row')
+
+        self.prepare_write()
+        if self._data.typecode == 'q' and (isinstance(value, float) or value not in INT64):
+            self._data = array('d', self._data)
+        self._data[offset] = value
+
+
+    def assign_slice(self, index: tuple, value):
+        self.prepare_write()
+        target = self.slice(index)
+        del self.views[id(target)]
+
+        if isinstance(value, Matrix):
+            if value.dims != target.dims:
+                raise RuntimeError('Wrong dimensions in matrix slice assignment')
+            values = value.data
+            widen = value.typecode == 'd'
+        else:
+            values = None
+            widen = isinstance(value, float) or value not in INT64
+
+        if widen and self._data.typecode == 'q':
+            self._data = array('d', self._data)
+
+        data = self._data
+        _, offset, strides = target.source
+        done = 0
+        for start, step, count in runs(offset, strides, target.shape):
+            if values is None:
+                data[start:start + (count - 1) * step + 1:step] = array(data.typecode, [value]) * count
+            else:
+                data[start:start + (count - 1) * step + 1:step] = array(data.typecode, values[done:done + count])
+            done += count
+
+
+    def copy(self):
+        return Matrix(self.shape, self.data[:])
+
+
+    def transpose(self):
+        owner, offset, strides = self.layout()
+
+        if len(self.shape) == 1:
+            return Matrix.view(owner, offset, (strides[0], 1), (self.shape[0], 1))
+
+        rows, cols = self.shape
+        if cols == 1:
+            return Matrix.view(owner, offset, strides[:1], (rows,))
+
+        return Matrix.view(owner, offset, (strides[1], strides[0]), (cols, rows))
+
+
+    def tolist(self):
+        if len(self.shape) == 1:
+            return self.data.tolist()
+        rows, cols = self.shape
+        data = self.data
+        return [data[i * cols:(i + 1) * cols].tolist() for i in range(rows)]
+
+
+    def __eq__(self, other):
+        return isinstance(other, Matrix) and self.shape == other.shape and self.data == other.data
+
+
+    def __ne__(self, other):
+        return not self == other
+
+
+    __hash__ = None
+
+
+    def __reduce__(self):
+        return Matrix, (self.shape, self.data)
+
+
+    def __repr__(self):
+        return repr(self.tolist())
+
+
+def runs(offset: int, strides: tuple, shape: tuple):
+    # (start, step, count) of every row of a strided layout, rows of a 1-D layout being the whole vector
+    if len(shape) == 1:
+        shape, strides = (1,) + shape, (0,) + strides
+    rows, cols = shape
+    if cols:
+        for i in range(rows):
+            yield offset + i * strides[0], strides[1], cols
@@ -1,50 +1,27 @@
-from collections import deque
-from typing import Any, Deque, Dict
-
-
-class Memory:
-
-    def __init__(self, name: str):
-        self.name = name
-        self.memory: Dict[str, Any] = {}
-
-    def has_key(self, name: str):
-        return name in self.memory
-
-    def get(self, name: str):
-        return self.memory[name]
-
-    def put(self, name: str, value: Any):
-        self.memory[name] = value
-
-
-class MemoryStack:
-                                                                             
-    def __init__(self, memory=None): # initialize memory stack with memory <memory>
-        self.stack: Deque[Memory] = deque()
-        if memory:
-            self.stack.appendleft(Memory(name=memory))
-
-    def get(self, name):             # gets from memory stack current value of variable <name>
-        for memory in self.stack:
-            if memory.has_key(name):
-                return memory.get(name)
-
-    def insert(self, name: str, value: Any): # inserts into memory stack variable <name> with value <value>
-        self.stack[0].put(name, value)
-
-    def set(self, name: str, value: Any): # sets variable <name> to value <value>
-        for memory in self.stack:
-            if memory.has_key(name):
-                memory.put(name, value)
-                return
-
-        self.insert(name, value)
-
-    def push(self, memory: str): # pushes memory <memory> onto the stack
-        self.stack.appendleft(Memory(name=memory))
-
-    def pop(self):          # pops the top memory from the stack
-        self.stack.popleft()
-
-
+from typing import Any, List
+
+
+class FrameStack:
+    """Slot-addressed variable storage.
+
+    Variables are resolved by the TypeChecker to a (depth, slot) pair, so reads
+    and writes index straight into a frame instead of searching scopes by name.
+    """
+
+    def __init__(self, size: int = 0): # initialize the stack with a global frame of <size> slots
+        self.frames: List[List[Any]] = [[None] * size]
+
+    def get(self, depth: int, slot: int): # gets value held in <slot> of frame <depth>
+        return self.frames[depth][slot]
+
+    def set(self, depth: int, slot: int, value: Any): # sets <slot> of frame <depth> to <value>
+        self.frames[depth][slot] = value
+
+    def grow(self, size: int): # grows the global frame to <size> slots, in place
+        self.frames[0].extend([None] * (size - len(self.frames[0])))
+
+    def push(self, size: int): # pushes a new frame with <size> empty slots
+        self.frames.append([None] * size)
+
+    def pop(self): # pops the innermost frame
+        self.frames.pop()
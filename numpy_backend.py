@@ -0,0 +1,217 @@
+from array import array
+from functools import partial
+from matrix import Matrix, fused_layout, result_typecode
+import interpreter
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+# NumPy works directly on the Matrix buffers through zero-copy views, so values,
+# indexing and printing stay exactly those of the pure-Python backend. Where
+# NumPy would wrap an integer past 64 bits, or warn about a division by zero,
+# an overflow or an invalid float operation, the pure-Python kernel computes
+# the result instead, widening or raising as that backend does.
+
+def view(a: Matrix):
+    dtype = numpy.int64 if a.typecode == 'q' else numpy.float64
+    if a.source is None:
+        return numpy.frombuffer(a.data, dtype=dtype).reshape(a.dims)
+
+    # slices and transposes are read in place, through their strides over the owner's buffer
+    owner, offset, strides = a.source
+    if len(strides) == 1:
+        strides = (0,) + strides
+    buffer = numpy.frombuffer(owner.data, dtype=dtype)[offset:]
+    return numpy.lib.stride_tricks.as_strided(buffer, shape=a.dims, strides=[8 * s for s in strides],
+                                              writeable=False)
+
+
+def allocate(shape: tuple, code: str):
+    size = shape[0] * shape[1] if len(shape) == 2 else shape[0]
+    res = Matrix(shape, array(code, bytes(8 * size)))
+    return res, view(res)
+
+
+INT64_MAX = 2 ** 63 - 1
+
+
+def magnitude(x) -> int:
+    # largest absolute value of an integer view or scalar, as an exact Python int
+    if isinstance(x, numpy.ndarray):
+        return max(-int(x.min()), int(x.max())) if x.size else 0
+    return abs(x)
+
+
+def int_bound(op: str, a: int, b: int) -> int:
+    # bound on the magnitude of an integer result from those of its operands
+    return a * b if op == '*' else a + b
+
+
+def checked(res: Matrix, compute, fallback):
+    # res once compute has filled it, or the pure-Python result where NumPy raises a floating point error
+    try:
+        with numpy.errstate(divide='raise', over='raise', invalid='raise'):
+            compute()
+        return res
+    except FloatingPointError:
+        pass
+    # outside the handler, so what the fallback raises is not chained to NumPy's error
+    return fallback()
+
+
+ufuncs = {
+    '+': numpy.add,
+    '-': numpy.subtract,
+    '*': numpy.multiply,
+    '/': numpy.true_divide,
+} if numpy else {}
+
+
+def mat_elements_op(a: Matrix, b: Matrix, op: str):
+    if not isinstance(a, Matrix) or not isinstance(b, Matrix):
+        return mat_scalar_op(a, b, op)
+    if a.dims != b.dims:
+        raise RuntimeError(f"Wrong dimensions in matrix elementwise '{op}' operation")
+
+    code = 'd' if op == '/' else result_typecode(a.typecode, b.typecode)
+    fallback = partial(interpreter.mat_elements_op, a, b, op)
+    if code == 'q' and int_bound(op, magnitude(view(a)), magnitude(view(b))) > INT64_MAX:
+        return fallback()
+
+    res, out = allocate(a.shape, code)
+    return checked(res, partial(ufuncs[op], view(a), view(b), out=out), fallback)
+
+
+def mat_scalar_op(a, b, op: str):
+    matrix, scalar = (a, b) if isinstance(a, Matrix) else (b, a)
+    code = 'd' if op == '/' or isinstance(scalar, float) else matrix.typecode
+    fallback = partial(interpreter.mat_scalar_op, a, b, op)
+    if code == 'q' and int_bound(op, magnitude(view(matrix)), magnitude(scalar)) > INT64_MAX:
+        return fallback()
+
+    res, out = allocate(matrix.shape, code)
+    if matrix is a:
+        return checked(res, partial(ufuncs[op], view(a), b, out=out), fallback)
+    return checked(res, partial(ufuncs[op], a, view(b), out=out), fallback)
+
+
+def mat_add(a, b):
+    if isinstance(a, Matrix) and isinstance(b, Matrix):
+        return mat_elements_op(a, b, '+')
+    return mat_scalar_op(a, b, '+')
+
+
+def mat_mul(a: Matrix, b: Matrix):
+    a_rows, inner = a.dims
+    b_rows, b_cols = b.dims
+
+    if inner != b_rows:
+        raise RuntimeError('Wrong dimensions in matrix multiplication')
+
+    code = result_typecode(a.typecode, b.typecode)
+    fallback = partial(interpreter.mat_mul, a, b)
+    # every partial sum is at most inner products of the largest magnitudes
+    if code == 'q' and inner * magnitude(view(a)) * magnitude(view(b)) > INT64_MAX:
+        return fallback()
+
+    res, out = allocate((a_rows, b_cols), code)
+    return checked(res, partial(numpy.matmul, view(a), view(b), out=out), fallback)
+
+
+def fused_overflows(code: tuple, operands: list[Matrix]):
+    # whether any step of an integer chain could leave int64, from the magnitudes of its operands
+    bounds = []
+    for item in code:
+        if isinstance(item, int):
+            bounds.append(magnitude(view(operands[item])))
+            continue
+        b, a = bounds.pop(), bounds.pop()
+        bounds.append(int_bound(item[-1], a, b))
+        if bounds[-1] > INT64_MAX:
+            return True
+    return False
+
+
+def mat_fused(code: tuple, operands: list[Matrix]):
+    shape, typecode = fused_layout(code, operands)
+    fallback = partial(interpreter.mat_fused, code, operands)
+    if typecode == 'q' and fused_overflows(code, operands):
+        return fallback()
+
+    res, out = allocate(shape, typecode)
+    return checked(res, partial(fused_chain, code, operands, out), fallback)
+
+
+def fused_chain(code: tuple, operands: list[Matrix], out):
+    # intermediate results are reused as outputs when their dtype fits, the last operation writes to out
+    stack = []
+    for position, item in enumerate(code):
+        if isinstance(item, int):
+            stack.append((view(operands[item]), False))
+            continue
+        (b, b_owned), (a, a_owned) = stack.pop(), stack.pop()
+        dtype = numpy.float64 if item == './' or 'f' in (a.dtype.kind, b.dtype.kind) else numpy.int64
+        if position == len(code) - 1:
+            target = out
+        elif a_owned and a.dtype == dtype:
+            target = a
+        elif b_owned and b.dtype == dtype:
+            target = b
+        else:
+            target = None
+        stack.append((ufuncs[item[-1]](a, b, out=target), True))
+
+
+def mat_eye_mul(a: Matrix, n: int, axis: int):
+    if a.dims[axis] != n:
+        raise RuntimeError('Wrong dimensions in matrix multiplication')
+    # only an integer a is exactly its float copy, see interpreter.mat_eye_mul
+    if a.typecode != 'q':
+        return mat_mul(mat_eye(n), a) if axis == 0 else mat_mul(a, mat_eye(n))
+
+    res, out = allocate(a.dims, 'd')
+    out[...] = view(a)
+    return res
+
+
+def mat_fill(value: float, n: int, m: int = None):
+    res, out = allocate((n, m if m else n), 'd')
+    out.fill(value)
+    return res
+
+
+def mat_eye(n: int):
+    res, out = allocate((n, n), 'd')
+    numpy.fill_diagonal(out, 1.0)
+    return res
+
+
+mat_operations = {
+    '+': mat_add,
+    '-': lambda a, b: mat_elements_op(a, b, '-'),
+    '*': mat_mul,
+    '==': lambda a, b: a == b,
+    '!=': lambda a, b: a != b,
+    '.+': lambda a, b: mat_elements_op(a, b, '+'),
+    '.-': lambda a, b: mat_elements_op(a, b, '-'),
+    '.*': lambda a, b: mat_elements_op(a, b, '*'),
+    './': lambda a, b: mat_elements_op(a, b, '/'),
+    'eye*': lambda n, a: mat_eye_mul(a, n, 0),
+    '*eye': lambda a, n: mat_eye_mul(a, n, 1),
+    'fused': mat_fused,
+}
+
+
+mat_functions = {
+    'eye': mat_eye,
+    'zeros': partial(mat_fill, 0.0),
+    'ones': partial(mat_fill, 1.0)
+}
+
+
+mat_unary_operations = {
+    'TRANSPOSE': lambda a: a.transpose(),
+}
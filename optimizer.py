@@ -0,0 +1,292 @@
+import AST
+from interpreter import ELEMENTWISE, Interpreter
+from matrix import Matrix
+from visit import on, when
+
+# strings and matrices with more elements than this are not folded, so a literal
+# never grows the tree (or the script cache) by more than a handful of nodes
+FOLD_LIMIT = 1024
+
+
+class Optimizer(object):
+    """Simplifies a type-checked AST.Program before it is executed.
+
+    - literal-only expressions (2*3+1, -(4), [1,2,3]') are evaluated once, by
+      the Interpreter itself, and replaced by the literal of their value,
+    - x+0, 0+x, x-0, x*1, 1*x on numbers and x+"" on strings become x,
+    - eye(n)*A and A*eye(n) become a checked float copy of A when A holds
+      integers; a float A is still multiplied by eye(n), as inf, nan and -0.0
+      do not survive the product unchanged,
+    - chains of element-wise matrix operations (A .* B .+ C ./ D) become one
+      FusedExpr, computed in a single pass into a single result matrix,
+    - an if-else with a constant condition keeps only the branch that runs.
+
+    Each visit returns the node that replaces the visited one. An expression
+    that fails to evaluate is left as it is, so it still fails at run time.
+    """
+
+    def __init__(self):
+        self.interpreter = Interpreter()
+
+
+    @on('node')
+    def visit(self, node):
+        return node
+
+
+    @when(AST.Ref)
+    def visit(self, node: AST.Ref):
+        node.indices = [self.visit(index) for index in node.indices]
+        return node
+
+
+    @when(AST.Range)
+    def visit(self, node: AST.Range):
+        node.start = self.visit(node.start)
+        node.end = self.visit(node.end)
+        return node
+
+
+    @when(AST.BinExpr)
+    def visit(self, node: AST.BinExpr):
+        node.left = self.visit(node.left)
+        node.right = self.visit(node.right)
+        return self.fold(node) or self.simplify(node) or self.fuse(node) or node
+
+
+    @when(AST.UnaryExpr)
+    def visit(self, node: AST.UnaryExpr):
+        node.value = self.visit(node.value)
+        return self.fold(node) or node
+
+
+    @when(AST.Vector)
+    def visit(self, node: AST.Vector):
+        node.values = [self.visit(value) for value in node.values]
+        return node
+
+
+    @when(AST.FunctionCall)
+    def visit(self, node: AST.FunctionCall):
+        node.args = [self.visit(arg) for arg in node.args]
+        return node
+
+
+    @when(AST.Assignment)
+    def visit(self, node: AST.Assignment):
+        node.value = self.visit(node.value)
+        node.ref = self.visit(node.ref)
+        return node
+
+
+    @when(AST.ReturnInstr)
+    def visit(self, node: AST.ReturnInstr):
+        node.value = self.visit(node.value)
+        return node
+
+
+    @when(AST.PrintInstr)
+    def visit(self, node: AST.PrintInstr):
+        node.args = [self.visit(arg) for arg in node.args]
+        return node
+
+
+    @when(AST.IfElseInstr)
+    def visit(self, node: AST.IfElseInstr):
+        node.condition = self.visit(node.condition)
+        node.then_block = self.visit(node.then_block)
+        if node.else_block:
+            node.else_block = self.visit(node.else_block)
+
+        if not self.is_constant(node.condition):
+            return node
+
+        try:
+            condition = node.condition.accept(self.interpreter)
+        except Exception:
+            return node
+
+        if condition:
+            return self.branch(node.lineno, node.then_block, node.then_frame_size)
+        return self.branch(node.lineno, node.else_block, node.else_frame_size)
+
+
+    @when(AST.ForLoop)
+    def visit(self, node: AST.ForLoop):
+        node.var_range = self.visit(node.var_range)
+        node.block = self.visit(node.block)
+        return node
+
+
+    @when(AST.WhileLoop)
+    def visit(self, node: AST.WhileLoop):
+        node.condition = self.visit(node.condition)
+        node.block = self.visit(node.block)
+        return node
+
+
+    @when(AST.VectorizedLoop)
+    def visit(self, node: AST.VectorizedLoop):
+        for loop in node.loops:
+            loop.var_range = self.visit(loop.var_range)
+        node.assignment = self.visit(node.assignment)
+        return node
+
+
+    @when(AST.Program)
+    def visit(self, node: AST.Program):
+        instructions = []
+
+        for instruction in node.instructions:
+            instruction = self.visit(instruction)
+            # a block without a frame of its own runs exactly like its instructions inlined
+            if isinstance(instruction, AST.Program) and not instruction.frame_size:
+                instructions.extend(instruction.instructions)
+            else:
+                instructions.append(instruction)
+
+        node.instructions = instructions
+        return node
+
+
+    def branch(self, lineno: int, block: AST.Node | None, frame_size: int):
+        # the kept branch still needs the frame the TypeChecker gave it, and a scoped
+        # Program only gets one when it runs as an instruction of another Program
+        if block is None:
+            return AST.Program(lineno, [])
+        if not frame_size:
+            return block
+
+        scoped = AST.Program(lineno, [block])
+        scoped.frame_size = frame_size
+        return AST.Program(lineno, [scoped])
+
+
+    # ------- FOLDING -------
+    def is_constant(self, node: AST.Node):
+        if isinstance(node, (AST.IntNum, AST.FloatNum, AST.String)):
+            return True
+        if isinstance(node, AST.Vector):
+            return all(self.is_constant(value) for value in node.values)
+        if isinstance(node, AST.BinExpr):
+            return self.is_constant(node.left) and self.is_constant(node.right) \
+                and not self.is_large_repeat(node)
+        if isinstance(node, AST.UnaryExpr):
+            return self.is_constant(node.value)
+        if isinstance(node, AST.FunctionCall):
+            sizes = [arg.value for arg in node.args if isinstance(arg, AST.IntNum)]
+            return bool(sizes) and len(sizes) == len(node.args) and 0 < sizes[0] * sizes[-1] <= FOLD_LIMIT
+        return False
+
+
+    def is_large_repeat(self, node: AST.BinExpr):
+        # "ab" * 1000000 is not worth building at compile time
+        return node.op == '*' and any(
+            isinstance(operand, AST.IntNum) and operand.value > FOLD_LIMIT for operand in (node.left, node.right))
+
+
+    def fold(self, node: AST.BinExpr | AST.UnaryExpr):
+        if not self.is_constant(node):
+            return None
+        try:
+            value = node.accept(self.interpreter)
+        except Exception:
+            return None
+        return literal(node.lineno, value)
+
+
+    def simplify(self, node: AST.BinExpr):
+        op, left, right = node.op, node.left, node.right
+
+        if op == '*' and is_eye(left) and is_matrix(right):
+            return AST.BinExpr(node.lineno, 'eye*', left.args[0], right, node.dims, 'vector')
+        if op == '*' and is_eye(right) and is_matrix(left):
+            return AST.BinExpr(node.lineno, '*eye', left, right.args[0], node.dims, 'vector')
+
+        # only integer 0 and 1: x + 0.0 would turn an int x into a float
+        if op in ('+', '-') and is_int(right, 0) or op == '*' and is_int(right, 1):
+            operand = left
+        elif op == '+' and is_int(left, 0) or op == '*' and is_int(left, 1):
+            operand = right
+        elif op == '+' and is_string(right, ''):
+            return left if getattr(left, 'type', None) == 'str' else None
+        elif op == '+' and is_string(left, ''):
+            return right if getattr(right, 'type', None) == 'str' else None
+        else:
+            return None
+
+        # matrices are left alone, A + 0 is a new matrix, not A itself
+        return operand if getattr(operand, 'type', None) in ('int', 'float') else None
+
+
+    def fuse(self, node: AST.BinExpr):
+        if not is_elementwise(node):
+            return None
+
+        operands, code = [], []
+        chain(node, operands, code)
+        if len(code) - len(operands) < 2:
+            return None
+        return AST.FusedExpr(node.lineno, operands, tuple(code), node.dims)
+    # -----------------------
+
+
+def is_int(node: AST.Node, value: int):
+    return isinstance(node, AST.IntNum) and node.value == value
+
+
+def is_string(node: AST.Node, value: str):
+    return isinstance(node, AST.String) and node.value == value
+
+
+def is_eye(node: AST.Node):
+    return isinstance(node, AST.FunctionCall) and node.name == 'eye' \
+        and len(node.args) == 1 and isinstance(node.args[0], AST.IntNum)
+
+
+def is_matrix(node: AST.Node):
+    return isinstance(node, (AST.Vector, AST.FunctionCall)) or getattr(node, 'type', None) == 'vector'
+
+
+def is_elementwise(node: AST.Node):
+    return isinstance(node, AST.BinExpr) and node.op in ELEMENTWISE \
+        and is_matrix(node.left) and is_matrix(node.right)
+
+
+def chain(node: AST.Node, operands: list, code: list):
+    # appends the postfix code of node to code, with everything that is not part of the chain as operands
+    if isinstance(node, AST.FusedExpr):
+        base = len(operands)
+        operands.extend(node.operands)
+        code.extend(item + base if isinstance(item, int) else item for item in node.code)
+    elif is_elementwise(node):
+        chain(node.left, operands, code)
+        chain(node.right, operands, code)
+        code.append(node.op)
+    else:
+        code.append(len(operands))
+        operands.append(node)
+
+
+def literal(lineno: int, value):
+    """Returns the literal node evaluating to value, or None if there is none."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return AST.IntNum(lineno, value)
+    if isinstance(value, float):
+        return AST.FloatNum(lineno, value)
+    if isinstance(value, str):
+        return AST.String(lineno, value) if len(value) <= FOLD_LIMIT else None
+    if isinstance(value, Matrix) and 0 < len(value.data) <= FOLD_LIMIT:
+        elements_type = 'int' if value.typecode == 'q' else 'float'
+        if len(value.shape) == 1:
+            return vector(lineno, value.data, elements_type)
+        rows = [vector(lineno, value.row(i).data, elements_type) for i in range(value.shape[0])]
+        return AST.Vector(lineno, rows, elements_type, list(value.shape))
+    return None
+
+
+def vector(lineno: int, data, elements_type: str):
+    values = [literal(lineno, element) for element in data]
+    return AST.Vector(lineno, values, elements_type, [1, len(values)])
@@ -1,11 +1,42 @@
 from sly import Parser
+from sly.yacc import LRTable
+import hashlib
+import os
+import pickle
+import sly
 import AST
 from scanner import Scanner
 
 
+TABLES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '__pycache__')
+
+# the table cache overrides sly's private Parser.__build_lrtables and fills in the
+# attributes Parser.parse reads; sly is pinned to the release it was written for,
+# so another one fails here instead of silently rebuilding or misreading tables
+SLY_VERSION = '0.5'
+if sly.__version__ != SLY_VERSION or not hasattr(Parser, '_Parser__build_lrtables'):
+    raise ImportError(f'parser.py caches the LR tables of sly {SLY_VERSION} through Parser.__build_lrtables, '
+                      f'found sly {sly.__version__}')
+
+
+class ParseTables(object):
+    """The parts of a sly LRTable that parsing needs, restored from the table cache."""
+
+    def __init__(self, lr_action, lr_goto, defaulted_states):
+        self.lr_action = lr_action
+        self.lr_goto = lr_goto
+        self.defaulted_states = defaulted_states
+
+
+def grammar_digest(grammar) -> str:
+    # tables refer to productions by number, so their order is part of the key
+    spec = [sly.__version__, grammar.Start, sorted(grammar.Terminals), sorted(grammar.Precedence.items())]
+    spec.extend((str(p), p.prec) for p in grammar.Productions)
+    return hashlib.sha256(repr(spec).encode()).hexdigest()[:16]
+
+
 class Mparser(Parser):
     tokens = Scanner.tokens
-    debugfile = 'parser.out'
     had_error = False
 
     precedence = (
@@ -20,7 +51,7 @@ class Mparser(Parser):
 
     start = 'program'
 
-    @_('instruction program')
+    @_('program instruction')
     def program(self, p):
         if self.had_error:
             return None
@@ -63,13 +94,21 @@ class Mparser(Parser):
     def ref(self, p):
         return AST.Ref(p.lineno, AST.Variable(p.lineno, p.ID), p.indices)
 
-    @_('expr "," indices')
+    @_('subscript "," indices')
     def indices(self, p):
-        return [p.expr, *p.indices]
+        return [p.subscript, *p.indices]
 
-    @_('expr')
+    @_('subscript')
     def indices(self, p):
-        return [p.expr]
+        return [p.subscript]
+
+    @_('expr')
+    def subscript(self, p):
+        return p.expr
+
+    @_('expr ":" expr')
+    def subscript(self, p):
+        return AST.Range(p.lineno, p.expr0, p.expr1)
 
     #
     # ----------- IF ELSE INSTRUCTION ------------
@@ -229,6 +268,37 @@ class Mparser(Parser):
     def string(self, p):
         return AST.String(p.lineno, p.STRING)
 
+    @classmethod
+    def _Parser__build_lrtables(cls):
+        # hook called by sly's Parser._build once the grammar is built: load the
+        # LALR tables from the cache instead of regenerating them on every start
+        path = os.path.join(TABLES_DIR, f'mparser.{grammar_digest(cls._grammar)}.pickle')
+        try:
+            with open(path, 'rb') as f:
+                cls._lrtable = ParseTables(*pickle.load(f))
+            return True
+        except (OSError, EOFError, TypeError, ValueError, pickle.UnpicklingError):
+            pass
+
+        super()._Parser__build_lrtables()
+        tables = (cls._lrtable.lr_action, cls._lrtable.lr_goto, cls._lrtable.defaulted_states)
+        try:
+            os.makedirs(TABLES_DIR, exist_ok=True)
+            with open(f'{path}.{os.getpid()}', 'wb') as f:
+                pickle.dump(tables, f, pickle.HIGHEST_PROTOCOL)
+            os.replace(f'{path}.{os.getpid()}', path)
+        except OSError:
+            pass
+        return True
+
+    @classmethod
+    def write_debugfile(cls, filename):
+        # the cached tables carry no state descriptions, so regenerate them for the dump
+        with open(filename, 'w') as f:
+            f.write(str(cls._grammar))
+            f.write('\n')
+            f.write(str(LRTable(cls._grammar)))
+
     def error(self, p):
         self.had_error = True
         if p:
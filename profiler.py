@@ -0,0 +1,146 @@
+from contextlib import contextmanager
+from time import perf_counter_ns
+import math
+import AST
+import interpreter
+from interpreter import Interpreter
+from matrix import Matrix
+
+
+class ProfilingInterpreter(Interpreter):
+    """The tree-walking Interpreter, timing every node it visits.
+
+    Every visit goes through Node.accept and so through this visit, which
+    hands the node to the Profiler around the normal dispatch. The plain
+    Interpreter has no such hook, so a run without --profile pays nothing.
+    """
+
+    def __init__(self, profiler: 'Profiler'):
+        self.profiler = profiler
+
+
+    def visit(self, node, *args, **kwargs):
+        profiler = self.profiler
+        profiler.enter(node)
+        try:
+            return Interpreter.visit(self, node, *args, **kwargs)
+        finally:
+            profiler.leave()
+
+
+class Profiler(object):
+    """Collects where the time of one program run goes.
+
+    Per node type and per source line: how often a node was visited, its
+    cumulative time (children included, counted once when nodes of the same
+    type or line nest) and its self time. Per stack of nodes, written as
+    "Program:1;ForLoop:3;Assignment:4": its self time, in the collapsed-stack
+    format flame graph tools read. Per matrix operation, function and unary
+    operation of the active backend: calls, the elements of the matrices it
+    returned, the largest of them and the time it took.
+    """
+
+    def __init__(self):
+        self.nodes = {}         # node type -> [calls, cumulative ns, self ns]
+        self.lines = {}         # lineno -> [calls, cumulative ns, self ns]
+        self.stacks = {}        # collapsed stack -> self ns
+        self.operations = {}    # operation -> [calls, elements, largest shape, ns]
+        self.frames = []        # visits in progress: [node, stack, start, ns spent in children]
+        self.active_nodes = {}  # node type -> visits of it in progress
+        self.active_lines = {}
+
+
+    def run(self, program: AST.Program):
+        runner = ProfilingInterpreter(self)
+        with self.matrix_operations():
+            program.accept(runner, toplevel=True)
+        return runner.return_value
+
+
+    def enter(self, node: AST.Node):
+        name = node.__class__.__name__
+        frame = f'{name}:{node.lineno}'
+        stack = f'{self.frames[-1][1]};{frame}' if self.frames else frame
+        self.active_nodes[name] = self.active_nodes.get(name, 0) + 1
+        self.active_lines[node.lineno] = self.active_lines.get(node.lineno, 0) + 1
+        self.frames.append([node, stack, perf_counter_ns(), 0])
+
+
+    def leave(self):
+        node, stack, start, children = self.frames.pop()
+        elapsed = perf_counter_ns() - start
+        if self.frames:
+            self.frames[-1][3] += elapsed
+
+        self.stacks[stack] = self.stacks.get(stack, 0) + elapsed - children
+        record(self.nodes, self.active_nodes, node.__class__.__name__, elapsed, elapsed - children)
+        record(self.lines, self.active_lines, node.lineno, elapsed, elapsed - children)
+
+
+    @contextmanager
+    def matrix_operations(self):
+        # the backend's tables are swapped for counting wrappers for the run, like use_backend swaps them
+        tables = (interpreter.mat_operations, interpreter.mat_functions, interpreter.mat_unary_operations)
+        saved = [dict(table) for table in tables]
+        for table in tables:
+            table.update({name: self.counted(name, operation) for name, operation in table.items()})
+        try:
+            yield
+        finally:
+            for table, implementation in zip(tables, saved):
+                table.clear()
+                table.update(implementation)
+
+
+    def counted(self, name: str, operation):
+        def count(*args):
+            start = perf_counter_ns()
+            result = operation(*args)
+            elapsed = perf_counter_ns() - start
+
+            stats = self.operations.setdefault(name, [0, 0, (), 0])
+            stats[0] += 1
+            stats[3] += elapsed
+            if isinstance(result, Matrix):
+                size = math.prod(result.shape)
+                stats[1] += size
+                if size > math.prod(stats[2]):
+                    stats[2] = result.shape
+            return result
+        return count
+
+
+    def report(self, file):
+        """Writes the node type, line and matrix operation tables, slowest first."""
+        print('\nnode type            calls   cumulative ms      self ms', file=file)
+        for name, (calls, cumulative, own) in sorted(self.nodes.items(), key=lambda item: -item[1][2]):
+            print(f'{name:<16} {calls:>9} {cumulative / 1e6:>14.3f} {own / 1e6:>12.3f}', file=file)
+
+        print('\nline                 calls   cumulative ms      self ms', file=file)
+        for lineno, (calls, cumulative, own) in sorted(self.lines.items(), key=lambda item: -item[1][2]):
+            print(f'{lineno:<16} {calls:>9} {cumulative / 1e6:>14.3f} {own / 1e6:>12.3f}', file=file)
+
+        if self.operations:
+            print('\nmatrix operation     calls       elements      largest           ms', file=file)
+            for name, (calls, elements, largest, ns) in sorted(self.operations.items(), key=lambda item: -item[1][3]):
+                shape = 'x'.join(map(str, largest)) or '-'
+                print(f'{name:<16} {calls:>9} {elements:>14} {shape:>12} {ns / 1e6:>12.3f}', file=file)
+
+
+    def write_stacks(self, file):
+        """Writes the collapsed stacks, self time in microseconds, for flamegraph.pl, speedscope and the like."""
+        for stack, ns in self.stacks.items():
+            if ns >= 1000:
+                print(f'{stack} {ns // 1000}', file=file)
+
+
+def record(stats: dict, active: dict, key, elapsed: int, own: int):
+    # cumulative time is only counted by the outermost of nested visits with the same key
+    active[key] -= 1
+    entry = stats.get(key)
+    if entry is None:
+        entry = stats[key] = [0, 0, 0]
+    entry[0] += 1
+    entry[2] += own
+    if not active[key]:
+        entry[1] += elapsed
@@ -5,6 +5,6 @@ print C;
 
 D = zeros(3, 4);
 D[0, 0] = 42;
-#D[1:3, 2:4] = 7; # opcjonalnie dla zainteresowanych
+D[1:3, 2:4] = 7; # opcjonalnie dla zainteresowanych
 print D;
 print D[2, 2];
@@ -22,6 +22,8 @@ class Scanner(Lexer):
                 ",", ";",                               # comma and semicolon
                 "'"}                                    # matrix transposition
 
+    had_error = False
+
     # String containing ignored characters between tokens (special name "ignore")
     ignore = " \t"
     ignore_comment = r"\#.*"
@@ -89,6 +91,7 @@ class Scanner(Lexer):
         self.lineno += len(t.value)
 
     def error(self, t):
+        self.had_error = True
         print("Line %d: Bad character %r in %r" % (self.lineno, t.value[0], t.value))
         self.index += 1
 
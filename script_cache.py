@@ -0,0 +1,67 @@
+import functools
+import gc
+import hashlib
+import os
+import pickle
+import sys
+import AST
+import interpreter
+
+# front-end modules whose code decides what a cached, checked AST looks like
+# (the Optimizer folds constants with the kernels of the active backend, so its
+# name is part of every entry's header too)
+FRONTEND = ['AST.py', 'scanner.py', 'parser.py', 'symbol_table.py', 'type_checker.py',
+            'vectorizer.py', 'optimizer.py', 'loop_hoister.py', 'interpreter.py', 'matrix.py',
+            'numpy_backend.py']
+CACHE_DIR = '__mcache__'
+
+
+@functools.cache
+def tool_version() -> str:
+    # hashed once per process, a batch worker or server checks many scripts
+    digest = hashlib.sha256(sys.version.encode())
+    root = os.path.dirname(os.path.abspath(__file__))
+    for name in FRONTEND:
+        with open(os.path.join(root, name), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+def source_hash(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def cache_path(filename: str, optimized: bool = True) -> str:
+    directory, name = os.path.split(os.path.abspath(filename))
+    variant = '' if optimized else '.unoptimized'
+    return os.path.join(directory, CACHE_DIR, f'{name}{variant}.pickle')
+
+
+def load(filename: str, text: str, optimized: bool = True) -> AST.Program | None:
+    """Returns the checked (and optimized) AST cached for this exact source, or None."""
+    # collecting while a large tree is being unpickled only rescans the new nodes
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        with open(cache_path(filename, optimized), 'rb') as f:
+            if pickle.load(f) != (tool_version(), interpreter.backend, source_hash(text)):
+                return None
+            return pickle.load(f)
+    except (OSError, EOFError, AttributeError, TypeError, ValueError, pickle.UnpicklingError):
+        return None
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+
+def store(filename: str, text: str, ast: AST.Program, optimized: bool = True):
+    # the header is a separate pickle so a stale entry is rejected without loading the tree
+    path = cache_path(filename, optimized)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(f'{path}.{os.getpid()}', 'wb') as f:
+            pickle.dump((tool_version(), interpreter.backend, source_hash(text)), f, pickle.HIGHEST_PROTOCOL)
+            pickle.dump(ast, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(f'{path}.{os.getpid()}', path)
+    except (OSError, RecursionError, pickle.PicklingError):
+        pass
@@ -0,0 +1,75 @@
+from concurrent.futures import ProcessPoolExecutor
+import json
+import os
+import signal
+import socketserver
+import stat
+import sys
+import time
+from batch import run_source, warm
+
+
+class ScriptServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Runs the scripts sent over a Unix-domain socket in warm worker processes.
+
+    A connection carries one request, a JSON object with the script's
+    "source" (and optionally its "engine" and whether to "optimize" it),
+    read until the client shuts its side down. The reply is the batch
+    record of the run (status, errors, output, exit_value and its run time)
+    with "total", the time from receiving the request to replying,
+    queueing for a worker included.
+
+    At most `workers` scripts run at once; the others wait for a worker.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, path: str, workers: int, backend: str):
+        self.pool = ProcessPoolExecutor(workers, initializer=warm, initargs=(backend,))
+        # start every worker now, before the first request and before any handler thread exists
+        for future in [self.pool.submit(time.sleep, 0.01) for _ in range(workers)]:
+            future.result()
+
+        if os.path.exists(path) and stat.S_ISSOCK(os.stat(path).st_mode):
+            os.unlink(path)     # left behind by a server that did not shut down
+        super().__init__(path, ScriptHandler)
+
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(cancel_futures=True)
+        try:
+            os.unlink(self.server_address)
+        except OSError:
+            pass
+
+
+class ScriptHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        received = time.perf_counter()
+        try:
+            request = json.loads(self.rfile.read())
+            future = self.server.pool.submit(run_source, request['source'], request.get('engine', 'tree'),
+                                             request.get('optimize', True))
+            response = future.result()
+        except (ValueError, KeyError, TypeError) as e:
+            response = {'status': 'bad request', 'errors': [str(e)], 'output': '', 'exit_value': None, 'time': 0.0}
+        except Exception as e:     # a worker that died takes its script with it
+            response = {'status': 'server error', 'errors': [f'{e.__class__.__name__}: {e}'], 'output': '',
+                        'exit_value': None, 'time': 0.0}
+
+        response['total'] = time.perf_counter() - received
+        self.wfile.write(json.dumps(response).encode())
+
+
+def serve(path: str, workers: int, backend: str):
+    with ScriptServer(path, workers, backend) as server:
+        # a daemon is usually stopped with SIGTERM, leave through server_close as on Ctrl-C
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        print(f'Serving on {path} with {workers} workers', file=sys.stderr)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
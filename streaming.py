@@ -0,0 +1,131 @@
+import mmap
+import os
+import sys
+import AST
+from scanner import Scanner
+from parser import Mparser
+from type_checker import TypeChecker
+from interpreter import Interpreter, RETURN
+from memory import FrameStack
+from closure_compiler import ClosureCompiler
+from vm import VM
+import bytecode
+from optimizer import Optimizer
+from loop_hoister import LoopHoister
+from vectorizer import Vectorizer
+import vectorizer
+
+
+def source_lines(filename: str):
+    """Yields (lineno, line) for every line of the file, read through a memory map."""
+    with open(filename, 'rb') as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as source:
+            for lineno, line in enumerate(iter(source.readline, b''), 1):
+                yield lineno, line.decode().rstrip('\r\n')
+
+
+def tokenize(scanner: Scanner, lines):
+    # no token spans two lines (strings and comments end with theirs), so lines are scanned one by one
+    for lineno, line in lines:
+        yield from scanner.tokenize(line, lineno)
+
+
+def statements(tokens):
+    """Groups tokens into the token lists of the top-level instructions.
+
+    An instruction ends with a ';' or a '}' outside of any block, unless the
+    next token is an 'else' continuing it.
+    """
+    statement, depth = [], 0
+    tokens = iter(tokens)
+    token = next(tokens, None)
+
+    while token is not None:
+        statement.append(token)
+        if token.type == '{':
+            depth += 1
+        elif token.type == '}':
+            depth -= 1
+        ends = depth <= 0 and token.type in (';', '}')
+
+        token = next(tokens, None)
+        if ends and (token is None or token.type != 'ELSE'):
+            yield statement
+            statement, depth = [], 0
+
+    if statement:
+        yield statement
+
+
+class StreamRunner(object):
+    """Checks and runs a script one top-level instruction at a time.
+
+    The file is memory-mapped and scanned lazily; each instruction is parsed,
+    checked, optimized and executed before the next one is read, so only one
+    instruction's tokens and AST are alive at a time. Variables persist in the
+    TypeChecker's global scope and in a global frame that grows as new ones
+    are declared.
+
+    Unlike a whole-file run, instructions before an error have already run
+    when it is found, and the script cache is not used.
+    """
+
+    def __init__(self, engine: str, optimize: bool = True):
+        self.optimize = optimize
+        self.checker = TypeChecker()
+        if engine == 'closure':
+            self.engine = ClosureCompiler()
+        elif engine == 'vm':
+            self.engine = VM()
+        else:
+            self.engine = Interpreter()
+        self.memory = self.engine.memory = FrameStack()
+
+
+    def run(self, filename: str, report: bool = False):
+        scanner = Scanner()
+        for tokens in statements(tokenize(scanner, source_lines(filename))):
+            program = self.compile(tokens)
+            if program is None:
+                return
+
+            if report:
+                for line in vectorizer.report(filename, program):
+                    print(line, file=sys.stderr)
+
+            if self.execute(program) == RETURN:
+                print(f'Program exited with value {self.engine.return_value}')
+                return
+
+
+    def compile(self, tokens: list):
+        # the checked (and optimized) Program holding the instruction, None if it must not run
+        parser = Mparser()
+        program = parser.parse(iter(tokens))
+        if program is None or parser.had_error:
+            return None
+
+        self.checker.visit(program)
+        if self.checker.errors:
+            self.checker.report_errors()
+            return None
+
+        if self.optimize:
+            program = LoopHoister().visit(Optimizer().visit(Vectorizer().visit(program)))
+            # keep the global slots the LoopHoister took from later declarations;
+            # '#' cannot start an identifier, so no variable resolves to them
+            scope = self.checker.scope
+            for slot in range(len(scope.slots), program.frame_size):
+                scope.declare(f'#hoisted{slot}')
+        return program
+
+
+    def execute(self, program: AST.Program):
+        self.memory.grow(program.frame_size)
+        if isinstance(self.engine, ClosureCompiler):
+            return self.engine.compile(program)()
+        if isinstance(self.engine, VM):
+            return self.engine.execute(bytecode.compile_program(program))
+        return program.accept(self.engine)
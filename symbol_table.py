@@ -40,3 +40,46 @@ class SymbolTable(object):
 
     def popScope(self):
         return self.parent
+
+
+class FrameScope(object):
+    """Runtime scope of the interpreter, resolved at check time.
+
+    Mirrors the scopes the interpreter opens (global, loops, if branches and
+    nested blocks). Every variable gets a fixed slot in the scope that owns it,
+    and only scopes that own at least one slot get a frame at run time.
+    """
+
+    def __init__(self, parent, name): # parent scope and scope name
+        self.parent = parent
+        self.scope_name = name
+        self.slots = {}
+
+
+    def resolve(self, name): # (scope, slot) of visible variable <name> or None
+        scope = self
+        while scope is not None:
+            if name in scope.slots:
+                return scope, scope.slots[name]
+            scope = scope.parent
+        return None
+
+
+    def declare(self, name): # allocate a slot for variable <name> in this scope
+        slot = self.slots[name] = len(self.slots)
+        return self, slot
+
+
+    @property
+    def depth(self): # index of the frame holding this scope's slots (valid once the scope is complete)
+        if self.parent is None:
+            return 0
+        return self.parent.depth + (1 if self.slots else 0)
+
+
+    def pushScope(self, name):
+        return FrameScope(self, name)
+
+
+    def popScope(self):
+        return self.parent
@@ -0,0 +1,507 @@
+import hashlib
+import importlib.util
+import math
+import os
+import py_compile
+import types
+import AST
+import interpreter
+from interpreter import operations
+from visit import on, when
+import script_cache
+
+# what every generated module starts with: the matrix runtime and the
+# Interpreter's rules for the values that may be matrices
+PRELUDE = '''\
+from interpreter import operations, mat_operations, mat_functions, mat_unary_operations, fused_expr, RETURN
+from matrix import Matrix
+
+
+def _binary(op, left, right):
+    if isinstance(left, Matrix) or isinstance(right, Matrix):
+        return mat_operations[op](left, right)
+    return operations[op](left, right)
+
+
+def _compound(op, old, value):
+    if isinstance(old, Matrix):
+        return mat_operations[op](old, value)
+    return operations[op](old, value)
+
+
+def _share(value):
+    # the value may be another variable's matrix, they only share it until one is written
+    return value.share() if isinstance(value, Matrix) else value
+
+
+def _print(value):
+    if isinstance(value, Matrix) and len(value.shape) == 2:
+        print('\\n[\\n  ', end='')
+        print(*value.tolist(), sep='\\n  ')
+        print(']')
+    else:
+        print(value, end=' ')
+
+'''
+
+# Python precedence of the expressions generated, tighter binding higher
+COMPARISON = 1
+PRECEDENCE = {'<': 1, '<=': 1, '>': 1, '>=': 1, '==': 1, '!=': 1, '+': 2, '-': 2, '*': 3, '/': 3}
+UNARY = 4
+ATOM = 5
+
+
+class PythonTranspiler(object):
+    """Translates a type-checked AST.Program into the source of a Python module.
+
+    The module's run() holds the program: every (depth, slot) is a local
+    variable, loops and ifs are Python's own, and matrices go through the
+    tables of interpreter.py, the backend's. Entering a scope sets the
+    variables of its frame to None, as pushing the frame does.
+
+    Operators work natively on values that can never be matrices, the other
+    ones dispatch on the values like the Interpreter does. Checked types
+    alone do not tell: a variable may hold a number at a check and a matrix
+    an iteration later, so scalar_slots finds the variables that only ever
+    hold numbers or strings.
+    """
+
+    def __init__(self, program: AST.Program):
+        self.scalars = scalar_slots(program)
+        self.lines = []
+        self.indent = 1
+        self.depth = 0
+        self.temporaries = 0
+
+
+    def module(self, program: AST.Program):
+        self.lines = [PRELUDE, 'def run():']
+        self.reset(0, program.frame_size)
+        self.statement(program)
+        self.line('return None')
+        return '\n'.join(self.lines) + '\n'
+
+
+    def line(self, code: str):
+        self.lines.append('    ' * self.indent + code)
+
+
+    def block(self, node: AST.Node, frame_size: int = 0):
+        # an indented block, a scope of its own when it declares anything
+        self.indent += 1
+        count = len(self.lines)
+        self.scoped(node, frame_size)
+        if len(self.lines) == count:
+            self.line('pass')
+        self.indent -= 1
+
+
+    def scoped(self, node: AST.Node, frame_size: int):
+        if not frame_size:
+            return self.statement(node)
+        self.depth += 1
+        self.reset(self.depth, frame_size)
+        self.statement(node)
+        self.depth -= 1
+
+
+    def reset(self, depth: int, frame_size: int):
+        if frame_size:
+            self.line(' = '.join(name(depth, slot) for slot in range(frame_size)) + ' = None')
+
+
+    def temporary(self):
+        self.temporaries += 1
+        return f'_t{self.temporaries}'
+
+
+    def plain(self, node: AST.Node):
+        return is_scalar(node, self.scalars)
+
+
+    # ---------- EXPRESSIONS ----------
+    # every expression is its Python source and that source's precedence
+
+
+    @on('node')
+    def expression(self, node):
+        return 'None', ATOM
+
+
+    @when(AST.IntNum)
+    def expression(self, node: AST.IntNum):
+        return literal(node.value)
+
+
+    @when(AST.FloatNum)
+    def expression(self, node: AST.FloatNum):
+        return literal(node.value)
+
+
+    @when(AST.String)
+    def expression(self, node: AST.String):
+        return repr(node.value), ATOM
+
+
+    @when(AST.Variable)
+    def expression(self, node: AST.Variable):
+        return name(node.depth, node.slot), ATOM
+
+
+    @when(AST.Ref)
+    def expression(self, node: AST.Ref):
+        return f'{name(node.variable.depth, node.variable.slot)}[{self.indices(node.indices)}]', ATOM
+
+
+    @when(AST.Range)
+    def expression(self, node: AST.Range):
+        return f'slice({self.source(node.start)}, {self.source(node.end)})', ATOM
+
+
+    @when(AST.BinExpr)
+    def expression(self, node: AST.BinExpr):
+        if node.op in PRECEDENCE and self.plain(node.left) and self.plain(node.right):
+            precedence = PRECEDENCE[node.op]
+            # operators associate to the left, and a comparison's operand is never
+            # a comparison, Python would chain them
+            left = self.source(node.left, precedence + (precedence == COMPARISON))
+            right = self.source(node.right, precedence + 1)
+            return f'{left} {node.op} {right}', precedence
+        return f'_binary({node.op!r}, {self.source(node.left)}, {self.source(node.right)})', ATOM
+
+
+    @when(AST.FusedExpr)
+    def expression(self, node: AST.FusedExpr):
+        operands = ', '.join(self.source(operand) for operand in node.operands)
+        return f'fused_expr({node.code!r}, [{operands}])', ATOM
+
+
+    @when(AST.UnaryExpr)
+    def expression(self, node: AST.UnaryExpr):
+        if node.op == '-':
+            return f'-{self.source(node.value, UNARY)}', UNARY
+        if node.op == 'TRANSPOSE':
+            return f"mat_unary_operations['TRANSPOSE']({self.source(node.value)})", ATOM
+        return 'None', ATOM
+
+
+    @when(AST.Vector)
+    def expression(self, node: AST.Vector):
+        values = ', '.join(self.source(value) for value in node.values)
+        return f'Matrix.from_values([{values}], {node.elements_type!r})', ATOM
+
+
+    @when(AST.FunctionCall)
+    def expression(self, node: AST.FunctionCall):
+        args = ', '.join(self.source(arg) for arg in node.args)
+        return f'mat_functions[{node.name!r}]({args})', ATOM
+
+
+    @when(AST.Hoisted)
+    def expression(self, node: AST.Hoisted):
+        cached = name(0, node.slot)
+        return f'({cached} if {cached} is not None else ({cached} := {self.source(node.value)}))', ATOM
+
+
+    def source(self, node: AST.Node, precedence: int = 0):
+        # the expression's source, parenthesized when it binds looser than precedence
+        code, own = self.expression(node)
+        return f'({code})' if own < precedence else code
+
+
+    def indices(self, indices: list[AST.Node]):
+        # always a tuple, like the Interpreter passes them
+        return ', '.join(self.source(index) for index in indices) + (',' if len(indices) == 1 else '')
+
+
+    # ---------- INSTRUCTIONS ----------
+
+
+    @on('node')
+    def statement(self, node):
+        pass
+
+
+    @when(AST.Assignment)
+    def statement(self, node: AST.Assignment):
+        if isinstance(node.ref, AST.Variable):
+            target = name(node.ref.depth, node.ref.slot)
+        else:
+            target = f'{name(node.ref.variable.depth, node.ref.variable.slot)}[{self.indices(node.ref.indices)}]'
+
+        if node.instr == '=':
+            value = self.source(node.value)
+        else:
+            op = node.instr[0]
+            native = self.plain(node.ref) and self.plain(node.value)
+            if isinstance(node.ref, AST.Ref):
+                # the value is computed before the old one is read, as in the Interpreter
+                operand = self.temporary()
+                self.line(f'{operand} = {self.source(node.value)}')
+            else:
+                operand = self.source(node.value, PRECEDENCE[op] + 1 if native else 0)
+            value = f'{target} {op} {operand}' if native else f'_compound({op!r}, {target}, {operand})'
+
+        if isinstance(node.ref, AST.Variable) and not self.plain(node):
+            value = f'_share({value})'
+        self.line(f'{target} = {value}')
+
+
+    @when(AST.ReturnInstr)
+    def statement(self, node: AST.ReturnInstr):
+        self.line(f'return RETURN, {self.source(node.value)}')
+
+
+    @when(AST.SpecialInstr)
+    def statement(self, node: AST.SpecialInstr):
+        self.line(node.name)
+
+
+    @when(AST.IfElseInstr)
+    def statement(self, node: AST.IfElseInstr):
+        self.line(f'if {self.source(node.condition)}:')
+        self.block(node.then_block, node.then_frame_size)
+
+        # else if chains stay at one indentation, Python limits how deep blocks nest
+        while isinstance(node.else_block, AST.IfElseInstr) and not node.else_frame_size:
+            node = node.else_block
+            self.line(f'elif {self.source(node.condition)}:')
+            self.block(node.then_block, node.then_frame_size)
+
+        if node.else_block:
+            self.line('else:')
+            self.block(node.else_block, node.else_frame_size)
+
+
+    @when(AST.PrintInstr)
+    def statement(self, node: AST.PrintInstr):
+        for arg in node.args:
+            if self.plain(arg):
+                self.line(f"print({self.source(arg)}, end=' ')")
+            else:
+                self.line(f'_print({self.source(arg)})')
+        self.line("print('')")
+
+
+    @when(AST.ForLoop)
+    def statement(self, node: AST.ForLoop):
+        start, end = self.temporary(), self.temporary()
+        self.line(f'{start}, {end} = {self.source(node.var_range.start)}, {self.source(node.var_range.end)}')
+        self.clear_hoisted(node.hoisted)
+        self.depth += bool(node.frame_size)
+        self.reset(self.depth, node.frame_size)
+
+        self.line(f'for {name(node.variable.depth, node.variable.slot)} in range({start}, {end} + 1):')
+        self.block(node.block)
+        self.depth -= bool(node.frame_size)
+
+
+    @when(AST.VectorizedLoop)
+    def statement(self, node: AST.VectorizedLoop):
+        # like the loops, an empty range runs nothing, the ranges inside it included
+        bounds, depth, indent = [], self.depth, self.indent
+        for loop in node.loops:
+            start, stop = self.temporary(), self.temporary()
+            end = self.source(loop.var_range.end, PRECEDENCE['+'])
+            self.line(f'{start}, {stop} = {self.source(loop.var_range.start)}, {end} + 1')
+            self.line(f'if {start} < {stop}:')
+            self.indent += 1
+            bounds.append((start, stop))
+            self.depth += bool(loop.frame_size)
+            self.reset(self.depth, loop.frame_size)
+
+        for loop, (start, stop) in zip(node.loops, bounds):
+            self.line(f'{name(loop.variable.depth, loop.variable.slot)} = slice({start}, {stop})')
+        self.statement(node.assignment)
+
+        # every loop that ran leaves its variable at the last value
+        for loop, (_, stop) in reversed(list(zip(node.loops, bounds))):
+            self.line(f'{name(loop.variable.depth, loop.variable.slot)} = {stop} - 1')
+            self.indent -= 1
+        self.indent = indent
+        self.depth = depth
+
+
+    @when(AST.WhileLoop)
+    def statement(self, node: AST.WhileLoop):
+        self.clear_hoisted(node.hoisted)
+        self.depth += bool(node.frame_size)
+        self.reset(self.depth, node.frame_size)
+
+        self.line(f'while {self.source(node.condition)}:')
+        self.block(node.block)
+        self.depth -= bool(node.frame_size)
+
+
+    @when(AST.Program)
+    def statement(self, node: AST.Program):
+        for instruction in node.instructions:
+            if isinstance(instruction, AST.Program):
+                self.scoped(instruction, instruction.frame_size)
+            else:
+                self.statement(instruction)
+
+
+    def clear_hoisted(self, slots: list[int]):
+        # values hoisted out of a loop are computed again, on first use, each time it starts
+        if slots:
+            self.line(' = '.join(name(0, slot) for slot in slots) + ' = None')
+
+
+def name(depth: int, slot: int):
+    return f'v{depth}_{slot}'
+
+
+def literal(value: int | float):
+    if isinstance(value, float) and not math.isfinite(value):
+        return f'float({str(value)!r})', ATOM
+    return repr(value), (UNARY if repr(value).startswith('-') else ATOM)
+
+
+def is_scalar(node: AST.Node, scalars: set):
+    """Whether the expression node never evaluates to a matrix, given the variables in scalars."""
+    if isinstance(node, (AST.IntNum, AST.FloatNum, AST.String)):
+        return True
+    if isinstance(node, AST.Variable):
+        return (node.depth, node.slot) in scalars
+    if isinstance(node, AST.Ref):
+        # two indices pick an element of a matrix, fewer pick a row
+        return len(node.indices) == 2 and not any(isinstance(index, AST.Range) for index in node.indices)
+    if isinstance(node, AST.BinExpr):
+        return node.op in operations and is_scalar(node.left, scalars) and is_scalar(node.right, scalars)
+    if isinstance(node, AST.UnaryExpr):
+        return node.op == '-' and is_scalar(node.value, scalars)
+    if isinstance(node, AST.Hoisted):
+        return is_scalar(node.value, scalars)
+    if isinstance(node, AST.Assignment):
+        # the value an assignment stores
+        if node.instr == '=':
+            return is_scalar(node.value, scalars)
+        return is_scalar(node.ref, scalars) and is_scalar(node.value, scalars)
+    return False
+
+
+def scalar_slots(program: AST.Program):
+    """Returns the (depth, slot) of the variables that only ever hold numbers or strings.
+
+    Starting from all of them, variables are dropped while a value assigned to
+    one may be a matrix, given the variables left.
+    """
+    assigned, matrices = [], set()
+    for node in instructions(program):
+        if isinstance(node, AST.Assignment) and isinstance(node.ref, AST.Variable):
+            assigned.append(((node.ref.depth, node.ref.slot), node))
+        elif isinstance(node, AST.ForLoop):
+            assigned.append(((node.variable.depth, node.variable.slot), AST.IntNum(node.lineno, 0)))
+        elif isinstance(node, AST.VectorizedLoop):
+            matrices.update((loop.variable.depth, loop.variable.slot) for loop in node.loops)
+
+    scalars = {key for key, _ in assigned} - matrices
+    changed = True
+    while changed:
+        changed = False
+        for key, value in assigned:
+            if key in scalars and not is_scalar(value, scalars):
+                scalars.discard(key)
+                changed = True
+    return scalars
+
+
+def instructions(node: AST.Node):
+    """Yields node and every instruction nested in it."""
+    yield node
+    if isinstance(node, AST.Program):
+        for instruction in node.instructions:
+            yield from instructions(instruction)
+    elif isinstance(node, AST.IfElseInstr):
+        yield from instructions(node.then_block)
+        if node.else_block:
+            yield from instructions(node.else_block)
+    elif isinstance(node, (AST.ForLoop, AST.WhileLoop)):
+        yield from instructions(node.block)
+
+
+def transpile(program: AST.Program):
+    """Returns the source of the Python module running program."""
+    return PythonTranspiler(program).module(program)
+
+
+def run(module):
+    """Runs a generated module like the Interpreter runs a program, returning the value it exited with."""
+    result = module.run()
+    if result is None:
+        return None
+    print(f'Program exited with value {result[1]}')
+    return result[1]
+
+
+def load_source(source: str, filename: str = '<transpiled>'):
+    """Returns a module straight from source, nothing written or cached.
+
+    None when CPython cannot compile it: its compiler limits how deeply
+    blocks nest (about 20 loops, 100 indentation levels), the program's
+    loops and ifs do not, so such a program is left to the Interpreter.
+    """
+    module = types.ModuleType('transpiled')
+    module.__file__ = filename
+    try:
+        code = compile(source, filename, 'exec')
+    except (SyntaxError, RecursionError):
+        return None
+    exec(code, module.__dict__)
+    return module
+
+
+# ---------- cache ----------
+# the module goes to __mcache__ next to the script and CPython keeps its .pyc in
+# __mcache__/__pycache__, checked against the module's hash instead of its mtime
+
+
+def cache_key(text: str, optimized: bool):
+    digest = hashlib.sha256(script_cache.tool_version().encode())
+    with open(os.path.abspath(__file__), 'rb') as f:
+        digest.update(f.read())
+    digest.update(b'optimized' if optimized else b'unoptimized')
+    # the AST it was transpiled from was folded with this backend's kernels
+    digest.update(interpreter.backend.encode())
+    digest.update(text.encode())
+    return digest.hexdigest()[:32]
+
+
+def cache_path(filename: str, optimized: bool = True):
+    return os.path.splitext(script_cache.cache_path(filename, optimized))[0] + '.py'
+
+
+def load(filename: str, text: str, optimized: bool = True):
+    """Returns the module cached for this exact source, or None."""
+    path = cache_path(filename, optimized)
+    key = cache_key(text, optimized)
+    try:
+        with open(path, 'r') as f:
+            if f.readline() != f'# {key}\n':
+                return None
+        return import_file(path, key)
+    except (OSError, SyntaxError, ImportError):
+        return None
+
+
+def store(filename: str, text: str, source: str, optimized: bool = True):
+    """Caches the module transpiled from text and returns it, None if it cannot be written or compiled."""
+    path = cache_path(filename, optimized)
+    key = cache_key(text, optimized)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(f'{path}.{os.getpid()}', 'w') as f:
+            f.write(f'# {key}\n{source}')
+        os.replace(f'{path}.{os.getpid()}', path)
+        py_compile.compile(path, doraise=True, invalidation_mode=py_compile.PycInvalidationMode.CHECKED_HASH)
+        return import_file(path, key)
+    except (OSError, py_compile.PyCompileError, ImportError):
+        return None
+
+
+def import_file(path: str, key: str):
+    spec = importlib.util.spec_from_file_location(f'_mscript_{key}', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
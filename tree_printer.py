@@ -149,6 +149,28 @@ class TreePrinter:
             n.printTree(indent)
 
 
+    @addToClass(AST.FusedExpr)
+    def printTree(self: AST.FusedExpr, indent=0):
+        TreePrinter.print(f"FUSED {' '.join(map(str, self.code))}", indent)
+        for n in self.operands:
+            n.printTree(indent + 1)
+
+
+    @addToClass(AST.Hoisted)
+    def printTree(self: AST.Hoisted, indent=0):
+        TreePrinter.print(f'HOISTED {self.slot}', indent)
+        self.value.printTree(indent + 1)
+
+
+    @addToClass(AST.VectorizedLoop)
+    def printTree(self: AST.VectorizedLoop, indent=0):
+        TreePrinter.print('VECTORIZED FOR', indent)
+        for loop in self.loops:
+            loop.variable.printTree(indent + 1)
+            loop.var_range.printTree(indent + 1)
+        self.assignment.printTree(indent + 1)
+
+
     @addToClass(AST.Error)
     def printTree(self: AST.Error, indent=0):
         TreePrinter.print(self.msg, indent)
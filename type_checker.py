@@ -1,101 +1,108 @@
 #!/usr/bin/python
 
-from collections import defaultdict
+from types import MappingProxyType
 import AST
-from symbol_table import SymbolTable, VariableSymbol
-
-ttype = defaultdict(lambda: defaultdict(lambda: defaultdict(str)))
-
-ttype['+']['int']['int'] = 'int'
-ttype['+']['int']['float'] = 'float'
-ttype['+']['float']['int'] = 'float'
-ttype['+']['float']['float'] = 'float'
-ttype['+']['str']['str'] = 'str'
-ttype['+']['vector']['int'] = 'vector'
-ttype['+']['vector']['float'] = 'vector'
-ttype['+']['int']['vector'] = 'vector'
-ttype['+']['float']['vector'] = 'vector'
-ttype['+']['vector']['vector'] = 'vector'
-
-ttype['-']['int']['int'] = 'int'
-ttype['-']['int']['float'] = 'float'
-ttype['-']['float']['int'] = 'float'
-ttype['-']['float']['float'] = 'float'
-ttype['-']['vector']['vector'] = 'vector'
-
-ttype['*']['int']['int'] = 'int'
-ttype['*']['int']['float'] = 'float'
-ttype['*']['float']['int'] = 'float'
-ttype['*']['float']['float'] = 'float'
-ttype['*']['vector']['vector'] = 'vector'
-ttype['*']['str']['int'] = 'str'
-ttype['*']['int']['str'] = 'str'
-
-ttype['/']['int']['int'] = 'int'
-ttype['/']['int']['float'] = 'float'
-ttype['/']['float']['int'] = 'float'
-ttype['/']['float']['float'] = 'float'
-
-ttype['>']['int']['int'] = 'bool'
-ttype['>']['int']['float'] = 'bool'
-ttype['>']['float']['int'] = 'bool'
-ttype['>']['float']['float'] = 'bool'
-
-ttype['<']['int']['int'] = 'bool'
-ttype['<']['int']['float'] = 'bool'
-ttype['<']['float']['int'] = 'bool'
-ttype['<']['float']['float'] = 'bool'
-
-ttype['>=']['int']['int'] = 'bool'
-ttype['>=']['int']['float'] = 'bool'
-ttype['>=']['float']['int'] = 'bool'
-ttype['>=']['float']['float'] = 'bool'
-
-ttype['<=']['int']['int'] = 'bool'
-ttype['<=']['int']['float'] = 'bool'
-ttype['<=']['float']['int'] = 'bool'
-ttype['<=']['float']['float'] = 'bool'
-
-ttype['==']['int']['int'] = 'bool'
-ttype['==']['int']['float'] = 'bool'
-ttype['==']['float']['int'] = 'bool'
-ttype['==']['float']['float'] = 'bool'
-ttype['==']['vector']['vector'] = 'bool'
-
-ttype['!=']['int']['int'] = 'bool'
-ttype['!=']['int']['float'] = 'bool'
-ttype['!=']['float']['int'] = 'bool'
-ttype['!=']['float']['float'] = 'bool'
-ttype['!=']['vector']['vector'] = 'bool'
-
-ttype['.+']['vector']['vector'] = 'vector'
-ttype['.-']['vector']['vector'] = 'vector'
-ttype['.*']['vector']['vector'] = 'vector'
-ttype['./']['vector']['vector'] = 'vector'
-
-ttype['+=']['int']['int'] = 'int'
-ttype['+=']['int']['float'] = 'float'
-ttype['+=']['float']['int'] = 'float'
-ttype['+=']['float']['float'] = 'float'
-ttype['+=']['str']['str'] = 'str'
-ttype['+=']['vector']['vector'] = 'vector'
-
-ttype['-=']['int']['int'] = 'int'
-ttype['-=']['int']['float'] = 'float'
-ttype['-=']['float']['int'] = 'float'
-ttype['-=']['float']['float'] = 'float'
-ttype['-=']['vector']['vector'] = 'vector'
-
-ttype['*=']['int']['int'] = 'int'
-ttype['*=']['int']['float'] = 'float'
-ttype['*=']['float']['int'] = 'float'
-ttype['*=']['float']['float'] = 'float'
-ttype['*=']['vector']['vector'] = 'vector'
-
-ttype['/=']['int']['int'] = 'int'
-ttype['/=']['int']['float'] = 'float'
-ttype['/=']['float']['int'] = 'float'
-ttype['/=']['float']['float'] = 'float'
+from symbol_table import FrameScope, SymbolTable, VariableSymbol
+
+# result type of every operation on the operand types it supports; frozen, so
+# checking (error-heavy scripts and long-lived processes included) never grows it
+ttype = MappingProxyType({
+    ('+', 'int', 'int'): 'int',
+    ('+', 'int', 'float'): 'float',
+    ('+', 'float', 'int'): 'float',
+    ('+', 'float', 'float'): 'float',
+    ('+', 'str', 'str'): 'str',
+    ('+', 'vector', 'int'): 'vector',
+    ('+', 'vector', 'float'): 'vector',
+    ('+', 'int', 'vector'): 'vector',
+    ('+', 'float', 'vector'): 'vector',
+    ('+', 'vector', 'vector'): 'vector',
+
+    ('-', 'int', 'int'): 'int',
+    ('-', 'int', 'float'): 'float',
+    ('-', 'float', 'int'): 'float',
+    ('-', 'float', 'float'): 'float',
+    ('-', 'vector', 'vector'): 'vector',
+
+    ('*', 'int', 'int'): 'int',
+    ('*', 'int', 'float'): 'float',
+    ('*', 'float', 'int'): 'float',
+    ('*', 'float', 'float'): 'float',
+    ('*', 'vector', 'vector'): 'vector',
+    ('*', 'str', 'int'): 'str',
+    ('*', 'int', 'str'): 'str',
+
+    ('/', 'int', 'int'): 'int',
+    ('/', 'int', 'float'): 'float',
+    ('/', 'float', 'int'): 'float',
+    ('/', 'float', 'float'): 'float',
+
+    ('>', 'int', 'int'): 'bool',
+    ('>', 'int', 'float'): 'bool',
+    ('>', 'float', 'int'): 'bool',
+    ('>', 'float', 'float'): 'bool',
+
+    ('<', 'int', 'int'): 'bool',
+    ('<', 'int', 'float'): 'bool',
+    ('<', 'float', 'int'): 'bool',
+    ('<', 'float', 'float'): 'bool',
+
+    ('>=', 'int', 'int'): 'bool',
+    ('>=', 'int', 'float'): 'bool',
+    ('>=', 'float', 'int'): 'bool',
+    ('>=', 'float', 'float'): 'bool',
+
+    ('<=', 'int', 'int'): 'bool',
+    ('<=', 'int', 'float'): 'bool',
+    ('<=', 'float', 'int'): 'bool',
+    ('<=', 'float', 'float'): 'bool',
+
+    ('==', 'int', 'int'): 'bool',
+    ('==', 'int', 'float'): 'bool',
+    ('==', 'float', 'int'): 'bool',
+    ('==', 'float', 'float'): 'bool',
+    ('==', 'vector', 'vector'): 'bool',
+
+    ('!=', 'int', 'int'): 'bool',
+    ('!=', 'int', 'float'): 'bool',
+    ('!=', 'float', 'int'): 'bool',
+    ('!=', 'float', 'float'): 'bool',
+    ('!=', 'vector', 'vector'): 'bool',
+
+    ('.+', 'vector', 'vector'): 'vector',
+    ('.-', 'vector', 'vector'): 'vector',
+    ('.*', 'vector', 'vector'): 'vector',
+    ('./', 'vector', 'vector'): 'vector',
+
+    ('+=', 'int', 'int'): 'int',
+    ('+=', 'int', 'float'): 'float',
+    ('+=', 'float', 'int'): 'float',
+    ('+=', 'float', 'float'): 'float',
+    ('+=', 'str', 'str'): 'str',
+    ('+=', 'vector', 'vector'): 'vector',
+
+    ('-=', 'int', 'int'): 'int',
+    ('-=', 'int', 'float'): 'float',
+    ('-=', 'float', 'int'): 'float',
+    ('-=', 'float', 'float'): 'float',
+    ('-=', 'vector', 'vector'): 'vector',
+
+    ('*=', 'int', 'int'): 'int',
+    ('*=', 'int', 'float'): 'float',
+    ('*=', 'float', 'int'): 'float',
+    ('*=', 'float', 'float'): 'float',
+    ('*=', 'vector', 'vector'): 'vector',
+
+    ('/=', 'int', 'int'): 'int',
+    ('/=', 'int', 'float'): 'float',
+    ('/=', 'float', 'int'): 'float',
+    ('/=', 'float', 'float'): 'float',
+})
+
+
+def result_type(op: str, left_type: str | None, right_type: str | None) -> str:
+    # '' when op does not take these types
+    return ttype.get((op, left_type, right_type), "")
 
 
 class NodeVisitor(object):
@@ -115,8 +122,13 @@ class TypeChecker(NodeVisitor):
 
     def __init__(self):
         self.symbol_table = SymbolTable(None, "global")
+        self.scope = FrameScope(None, "global")
         self.loop_indent = 0
         self.errors = []
+        self.resolved = []      # (AST.Variable, FrameScope) pairs awaiting their frame depth
+        self.frame_owners = []  # (node, attribute, FrameScope) triples awaiting their frame size
+        self.typed = []         # nodes given operand_types, kept if no run can disagree with them
+        self.assigned = []      # (AST.Variable, type, value node or None) for every value a variable gets
 
 
     # ------- EXTRA -------
@@ -126,6 +138,95 @@ class TypeChecker(NodeVisitor):
             for error in self.errors:
                 print(error)
     # ---------------------
+
+
+    # ------- FRAMES -------
+    def resolve(self, node: AST.Variable):
+        found = self.scope.resolve(node.name)
+        if found is None:
+            found = self.scope.declare(node.name)
+        scope, node.slot = found
+        self.resolved.append((node, scope))
+
+
+    def push_frame(self, name, owner: AST.Node, attribute: str):
+        self.scope = self.scope.pushScope(name)
+        self.frame_owners.append((owner, attribute, self.scope))
+
+
+    def pop_frame(self):
+        self.scope = self.scope.popScope()
+
+
+    def assign_frames(self):
+        # depths are only known once every enclosing scope has declared all its slots
+        for owner, attribute, scope in self.frame_owners:
+            setattr(owner, attribute, len(scope.slots))
+        for node, scope in self.resolved:
+            node.depth = scope.depth
+        self.frame_owners.clear()
+        self.resolved.clear()
+    # ----------------------
+
+
+    # ------- OPERAND TYPES -------
+    def record_operands(self, node: AST.BinExpr | AST.UnaryExpr | AST.Assignment, *types: str):
+        node.operand_types = types
+        self.typed.append(node)
+
+
+    def trust_types(self):
+        # types are not followed along branches and loops: a variable checked as a number
+        # may hold a matrix an iteration later. Operand types are only kept when all the
+        # values a variable is given agree on being a matrix or not, and so does every read.
+        scopes = {id(node): scope for node, scope in self.resolved}
+        assigned = [((scopes[id(variable)], variable.slot), var_type == 'vector', value)
+                    for variable, var_type, value in self.assigned]
+        matrices = {}       # (FrameScope, slot) -> whether the values it is given are matrices
+        disagreeing = set()
+        for slot, matrix, _ in assigned:
+            if matrices.setdefault(slot, matrix) != matrix:
+                disagreeing.add(slot)
+        for slot in disagreeing:
+            del matrices[slot]
+
+        changed = True
+        while changed:
+            changed = False
+            for slot, _, value in assigned:
+                if value is not None and slot in matrices and not self.trusted(value, matrices, scopes):
+                    del matrices[slot]
+                    changed = True
+
+        # operands are recorded before the expressions holding them, so their verdict is known
+        for node in self.typed:
+            if isinstance(node, AST.BinExpr):
+                operands = node.left, node.right
+            else:
+                operands = (node.value,) if isinstance(node, AST.UnaryExpr) else (node.ref, node.value)
+            if not all(self.trusted(operand, matrices, scopes, decided=True) for operand in operands):
+                node.operand_types = None
+        self.typed.clear()
+        self.assigned.clear()
+
+
+    def trusted(self, node: AST.Node, matrices: dict, scopes: dict, decided: bool = False):
+        # whether node's value is a matrix exactly when its checked type is 'vector'
+        if isinstance(node, AST.Variable):
+            return matrices.get((scopes.get(id(node)), node.slot)) == (node.type == 'vector')
+        if decided and isinstance(node, (AST.BinExpr, AST.UnaryExpr)):
+            return node.operand_types is not None
+        if isinstance(node, AST.BinExpr):
+            return self.trusted(node.left, matrices, scopes) and self.trusted(node.right, matrices, scopes)
+        if isinstance(node, AST.Ref):
+            # a range picks a matrix, a row and a column an element, one index may pick either
+            return len(node.indices) == 2 or any(isinstance(index, AST.Range) for index in node.indices)
+        if isinstance(node, AST.UnaryExpr):
+            return self.trusted(node.value, matrices, scopes)
+        if isinstance(node, AST.Assignment):
+            return self.trusted(node.ref, matrices, scopes) and self.trusted(node.value, matrices, scopes)
+        return isinstance(node, (AST.IntNum, AST.FloatNum, AST.String, AST.Vector, AST.FunctionCall))
+    # -----------------------------
     
 
     def visit_IntNum(self, node):
@@ -137,10 +238,12 @@ class TypeChecker(NodeVisitor):
 
 
     def visit_Variable(self, node):
+        self.resolve(node)
         symbol = self.symbol_table.get(node.name)
         if symbol is None:
             self.errors.append(f"[line: {node.lineno}] Undeclared variable {node.name}")
             return None
+        node.type = symbol.var_type
         return symbol.var_type
 
 
@@ -158,19 +261,28 @@ class TypeChecker(NodeVisitor):
         if symbol is None:
             return
 
-        if len(symbol.dims) < len(node.indices):
+        # dims are only known for matrices built from a literal or eye/zeros/ones
+        if symbol.dims and len(symbol.dims) < len(node.indices):
             self.errors.append(f"[line: {node.lineno}] Access with wrong dimensions (too many indices)")
             return symbol.elements_type
 
         for i, index in enumerate(node.indices):
             index_type = self.visit(index)
-            if index_type != 'int':
-                self.errors.append(f"[line: {node.lineno}] Type error in vector access (indices must be 'int') got '{index_type}'")
-            elif isinstance(index, AST.IntNum):
+            if index_type not in ('int', 'range'):
+                self.errors.append(f"[line: {node.lineno}] Type error in vector access (indices must be 'int' or ranges) got '{index_type}'")
+            elif symbol.dims and isinstance(index, AST.IntNum):
                 if index.value < 0 or index.value >= symbol.dims[i]:
                     self.errors.append(f"[line: {node.lineno}] Index out of range: {index.value}")
+            elif symbol.dims and isinstance(index, AST.Range) \
+                    and isinstance(index.start, AST.IntNum) and isinstance(index.end, AST.IntNum):
+                if not 0 <= index.start.value <= index.end.value <= symbol.dims[i]:
+                    self.errors.append(f"[line: {node.lineno}] Slice out of range: {index.start.value}:{index.end.value}")
 
-        return symbol.elements_type
+        if any(isinstance(index, AST.Range) for index in node.indices):
+            node.type = 'vector'
+        else:
+            node.type = symbol.elements_type
+        return node.type
 
 
     def visit_Range(self, node):
@@ -190,7 +302,8 @@ class TypeChecker(NodeVisitor):
         right_type = self.visit(node.right)
         op = node.op
 
-        if ttype[op][left_type][right_type] == "":
+        result = result_type(op, left_type, right_type)
+        if result == "":
             self.errors.append(f"[line: {node.lineno}] Type error in binary expression (not supported): {left_type} {op} {right_type}")
             return None
 
@@ -215,13 +328,17 @@ class TypeChecker(NodeVisitor):
             
             node.dims = left_dims if left_dims == right_dims else []
 
-        return ttype[op][left_type][right_type]
+        self.record_operands(node, left_type, right_type)
+        node.type = result
+        return node.type
 
         
     def visit_UnaryExpr(self, node):
         value_type = self.visit(node.value)
         op = node.op
         if op == "-" and value_type in ["int", "float"]:
+            self.record_operands(node, value_type)
+            node.type = value_type
             return value_type
         elif op == "TRANSPOSE" and value_type == "vector":
             if isinstance(node.value, AST.Variable):
@@ -237,6 +354,8 @@ class TypeChecker(NodeVisitor):
             if len(dims_before_op) == 1:
                 node.dims = [dims_before_op, 1]
 
+            self.record_operands(node, value_type)
+            node.type = value_type
             return value_type
         else:
             self.errors.append(f"[line: {node.lineno}] Type error in unary expression: {node.op} '{value_type}'")
@@ -313,6 +432,16 @@ class TypeChecker(NodeVisitor):
     def visit_Assignment(self, node: AST.Assignment):
         value_type = self.visit(node.value)
 
+        if isinstance(node.ref, AST.Ref) and any(isinstance(index, AST.Range) for index in node.ref.indices):
+            # a slice takes a scalar (filling it) or a matrix of its dims, compound assignment works as on matrices
+            if node.instr == '=' and value_type not in ['int', 'float', 'vector'] \
+                    or node.instr != '=' and result_type(node.instr, 'vector', value_type) == "":
+                self.errors.append(f"[line: {node.lineno}] Cannot assign value of type '{value_type}' to a matrix slice")
+            ref_type = self.visit(node.ref)
+            if node.instr != '=':
+                self.record_operands(node, ref_type, value_type)
+            return ref_type
+
         if node.instr == '=':
             if isinstance(node.ref, AST.Ref):
                 if value_type in ['str', 'vector']:
@@ -320,6 +449,7 @@ class TypeChecker(NodeVisitor):
                 return self.visit(node.ref)
             elif isinstance(node.ref, AST.Variable):
                 var_name = node.ref.name
+                self.resolve(node.ref)
 
                 if isinstance(node.value, AST.Vector) or isinstance(node.value, AST.FunctionCall):
                     var_symbol = VariableSymbol(var_name, value_type, node.value.dims, node.value.elements_type)
@@ -327,6 +457,7 @@ class TypeChecker(NodeVisitor):
                     var_symbol = VariableSymbol(var_name, value_type)
 
                 self.symbol_table.put(var_name, var_symbol)
+                self.assigned.append((node.ref, value_type, node.value))
 
                 return value_type
 
@@ -334,15 +465,19 @@ class TypeChecker(NodeVisitor):
             if isinstance(node.ref, AST.Ref):
                 if value_type in ['str', 'vector']:
                     self.errors.append(f"[line: {node.lineno}] Cannot assign value of type '{value_type}' to a vector element")
-                return self.visit(node.ref)
+                ref_type = self.visit(node.ref)
+                self.record_operands(node, ref_type, value_type)
+                return ref_type
             elif isinstance(node.ref, AST.Variable):
                 variable_type = self.visit(node.ref)
                 if variable_type is None:
                     return value_type
 
-                value_type = ttype[node.instr][variable_type][value_type]
+                self.record_operands(node, variable_type, value_type)
+                value_type = result_type(node.instr, variable_type, value_type)
                 var_symbol = VariableSymbol(node.ref.name, value_type)
                 self.symbol_table.put(node.ref.name, var_symbol)
+                self.assigned.append((node.ref, value_type, node))
                 return value_type
     
 
@@ -359,9 +494,13 @@ class TypeChecker(NodeVisitor):
         condition_type = self.visit(node.condition)
         if condition_type != "bool":
             self.errors.append(f"[line: {node.lineno}] Type error in condition in if-else: '{condition_type}'")
+        self.push_frame("if_then", node, "then_frame_size")
         self.visit(node.then_block)
+        self.pop_frame()
         if node.else_block:
+            self.push_frame("if_else", node, "else_frame_size")
             self.visit(node.else_block)
+            self.pop_frame()
 
 
     def visit_PrintInstr(self, node):
@@ -375,12 +514,16 @@ class TypeChecker(NodeVisitor):
             self.errors.append(f"[line: {node.lineno}] Type error in range in for loop: {range_type}")
 
         self.symbol_table = self.symbol_table.pushScope("for")
+        self.push_frame("for_loop", node, "frame_size")
         self.loop_indent += 1
 
         self.symbol_table.put(node.variable.name, VariableSymbol(node.variable.name, "int"))
+        self.resolve(node.variable)
+        self.assigned.append((node.variable, "int", None))
         self.visit(node.block)
 
         self.symbol_table = self.symbol_table.popScope()
+        self.pop_frame()
         self.loop_indent -= 1
 
 
@@ -390,11 +533,13 @@ class TypeChecker(NodeVisitor):
             self.errors.append(f"[line: {node.lineno}] Type error in condition in while-loop '{condition_type}'")
 
         self.symbol_table = self.symbol_table.pushScope("while")
+        self.push_frame("while_loop", node, "frame_size")
         self.loop_indent += 1
 
         self.visit(node.block)
 
         self.symbol_table = self.symbol_table.popScope()
+        self.pop_frame()
         self.loop_indent -= 1
 
 
@@ -402,8 +547,20 @@ class TypeChecker(NodeVisitor):
 
 
     def visit_Program(self, node: AST.Program):
+        toplevel = self.scope.parent is None
+
         for instruction in node.instructions:
-            self.visit(instruction)
+            if isinstance(instruction, AST.Program):
+                self.push_frame("block", instruction, "frame_size")
+                self.visit(instruction)
+                self.pop_frame()
+            else:
+                self.visit(instruction)
+
+        if toplevel:
+            node.frame_size = len(self.scope.slots)
+            self.trust_types()
+            self.assign_frames()
         
 
     def visit_Error(self, node):
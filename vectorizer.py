@@ -0,0 +1,175 @@
+import AST
+from visit import on, when
+
+SCALAR_TYPES = ('int', 'float')
+ELEMENT_OPERATORS = {'+': '.+', '-': '.-', '*': '.*'}
+
+
+class Vectorizer(object):
+    """Turns ForLoop nests that compute a matrix element by element into one
+    bulk matrix operation.
+
+    A nest qualifies when its innermost body is a single assignment to a
+    matrix element indexed by the nest's loop variables, each used exactly
+    once, like
+
+        for i = 0:n-1 { for j = 0:m-1 { C[i, j] = A[i, j] * 2 + B[i, j]; } }
+
+    and the value only combines, with + - * and unary -, elements read at
+    the very same indices and scalars the nest does not change. No iteration
+    then reads what another one writes. The loop ranges must not depend on
+    the loop variables or on any matrix.
+
+    Such a nest becomes an AST.VectorizedLoop: its assignment runs once with
+    every loop variable holding the slice its range covers, so the element
+    reads are views and + - * work on whole matrices (.+ .- .*). Division is
+    left to the loops, a zero divisor must raise exactly where it would.
+    As with the loops, a range is only evaluated when the ones outside it are
+    not empty, and each loop that ran leaves its variable at its last value.
+    """
+
+    @on('node')
+    def visit(self, node):
+        return node
+
+
+    @when(AST.IfElseInstr)
+    def visit(self, node: AST.IfElseInstr):
+        node.then_block = self.visit(node.then_block)
+        if node.else_block:
+            node.else_block = self.visit(node.else_block)
+        return node
+
+
+    @when(AST.ForLoop)
+    def visit(self, node: AST.ForLoop):
+        vectorized = vectorize(node)
+        if vectorized is not None:
+            return vectorized
+
+        node.block = self.visit(node.block)
+        return node
+
+
+    @when(AST.WhileLoop)
+    def visit(self, node: AST.WhileLoop):
+        node.block = self.visit(node.block)
+        return node
+
+
+    @when(AST.Program)
+    def visit(self, node: AST.Program):
+        node.instructions = [self.visit(instruction) for instruction in node.instructions]
+        return node
+
+
+def vectorize(loop: AST.ForLoop):
+    """Returns the AST.VectorizedLoop replacing the nest starting at loop, or None."""
+    loops, body = [], loop
+    while isinstance(body, AST.ForLoop):
+        loops.append(body)
+        body = single_instruction(body.block)
+
+    if not isinstance(body, AST.Assignment) or not isinstance(body.ref, AST.Ref) or body.instr == '/=':
+        return None
+
+    keys = {(loop.variable.depth, loop.variable.slot) for loop in loops}
+    if not all(is_scalar(loop.var_range.start, keys) and is_scalar(loop.var_range.end, keys) for loop in loops):
+        return None
+
+    target = body.ref
+    indices = [index_key(index, keys) for index in target.indices]
+    loop_indices = [index for index in indices if index in keys]
+    if None in indices or len(loop_indices) != len(keys) or set(loop_indices) != keys:
+        return None
+
+    value = elements(body.value, indices, keys)
+    if value is None:
+        return None
+    if body.instr != '=':
+        element = AST.Ref(target.lineno, target.variable, target.indices, 'vector')
+        value = AST.BinExpr(body.lineno, ELEMENT_OPERATORS[body.instr[0]], element, value, type='vector')
+
+    return AST.VectorizedLoop(loop.lineno, loops, AST.Assignment(body.lineno, '=', target, value))
+
+
+def single_instruction(block: AST.Node):
+    # a block holding one instruction, and declaring nothing, is that instruction
+    while isinstance(block, AST.Program) and len(block.instructions) == 1 and not block.frame_size:
+        block = block.instructions[0]
+    return block
+
+
+def index_key(index: AST.Node, keys: set):
+    # what tells element indices apart: the variable's (depth, slot) or the literal's value
+    if isinstance(index, AST.Variable) and ((index.depth, index.slot) in keys or index.type == 'int'):
+        return index.depth, index.slot
+    if isinstance(index, AST.IntNum):
+        return index.value
+    return None
+
+
+def is_scalar(node: AST.Node, keys: set):
+    """Whether node is a number the loop nest cannot change."""
+    if isinstance(node, (AST.IntNum, AST.FloatNum)):
+        return True
+    if isinstance(node, AST.Variable):
+        return node.type in SCALAR_TYPES and (node.depth, node.slot) not in keys
+    if isinstance(node, AST.BinExpr):
+        return node.op in ('+', '-', '*', '/') and is_scalar(node.left, keys) and is_scalar(node.right, keys)
+    if isinstance(node, AST.UnaryExpr):
+        return node.op == '-' and is_scalar(node.value, keys)
+    return False
+
+
+def elements(node: AST.Node, indices: list, keys: set):
+    """Returns node computed on whole matrices instead of single elements, or None.
+
+    Scalars are returned as they are, element reads at indices become Refs
+    of matrix type, to be read as views once the loop variables hold slices.
+    """
+    if is_scalar(node, keys):
+        return node
+
+    if isinstance(node, AST.Ref):
+        if [index_key(index, keys) for index in node.indices] != indices:
+            return None
+        return AST.Ref(node.lineno, node.variable, node.indices, 'vector')
+
+    if isinstance(node, AST.BinExpr) and node.op in ELEMENT_OPERATORS:
+        left = elements(node.left, indices, keys)
+        right = elements(node.right, indices, keys)
+        if left is None or right is None:
+            return None
+        return AST.BinExpr(node.lineno, ELEMENT_OPERATORS[node.op], left, right, type='vector')
+
+    if isinstance(node, AST.UnaryExpr) and node.op == '-':
+        value = elements(node.value, indices, keys)
+        if value is None:
+            return None
+        # -x and x * -1 are the same number, sign of zero included
+        return AST.BinExpr(node.lineno, '.*', value, AST.IntNum(node.lineno, -1), type='vector')
+
+    return None
+
+
+def vectorized_loops(node: AST.Node):
+    """Yields every AST.VectorizedLoop among the instructions of node."""
+    if isinstance(node, AST.VectorizedLoop):
+        yield node
+    elif isinstance(node, AST.Program):
+        for instruction in node.instructions:
+            yield from vectorized_loops(instruction)
+    elif isinstance(node, AST.IfElseInstr):
+        yield from vectorized_loops(node.then_block)
+        if node.else_block:
+            yield from vectorized_loops(node.else_block)
+    elif isinstance(node, (AST.ForLoop, AST.WhileLoop)):
+        yield from vectorized_loops(node.block)
+
+
+def report(filename: str, node: AST.Node):
+    """Yields the --vectorize-report line of every vectorized loop in node."""
+    for loop in vectorized_loops(node):
+        names = ', '.join(nested.variable.name for nested in loop.loops)
+        yield f"{filename}:{loop.lineno}: vectorized for loop over {names}"
@@ -6,7 +6,7 @@ __all__ = ['on', 'when']
 def on(param_name):
     def f(fn):
         dispatcher = Dispatcher(param_name, fn)
-        return dispatcher
+        return dispatcher.function
     return f
 
 
@@ -18,33 +18,83 @@ def when(param_type):
         if not isinstance(dispatcher, Dispatcher):
             dispatcher = dispatcher.dispatcher
         dispatcher.add_target(param_type, fn)
-
-        def ff(*args, **kw):
-            return dispatcher(*args, **kw)
-        ff.dispatcher = dispatcher
-        return ff
+        # the class attribute stays the dispatch function itself, no wrapper frame per call
+        return dispatcher.function
     return f
 
 
 class Dispatcher(object):
+    """Calls the target registered for the class of one argument.
+
+    Targets are looked up along the argument's MRO, so a subclass uses the
+    target of its nearest registered base and falls back to the function
+    decorated with @on when none matches. The resolved target is cached per
+    class; registering a new target clears the cache.
+    """
+
     def __init__(self, param_name, fn):
         self.param_index = self.__argspec(fn).args.index(param_name)
         self.param_name = param_name
+        self.default = fn
         self.targets = {}
+        self.cache = {}
+        self.function = self.__build_function()
+        self.single = self.__build_single()
 
     def __call__(self, *args, **kw):
         typ = args[self.param_index].__class__
-        d = self.targets.get(typ)
-        if d is not None:
-            return d(*args, **kw)
+        target = self.cache.get(typ)
+        if target is None:
+            target = self.resolve(typ)
+        return target(*args, **kw)
+
+    def resolve(self, typ):
+        for base in typ.__mro__:
+            target = self.targets.get(base)
+            if target is not None:
+                break
         else:
-            issub = issubclass
-            t = self.targets
-            ks = iter(t)
-            return [t[k](*args, **kw) for k in ks if issub(typ, k)]
+            target = self.default
+        self.cache[typ] = target
+        return target
 
     def add_target(self, typ, target):
         self.targets[typ] = target
+        self.cache.clear()
+
+    def __build_function(self):
+        # methods dispatch on the argument right after self; forwarding *args/**kw costs
+        # several times a plain call, so calls without extra arguments skip it
+        if self.param_index != 1:
+            def dispatch(*args, **kw):
+                return self(*args, **kw)
+        else:
+            cache, resolve = self.cache, self.resolve
+
+            def dispatch(obj, node, *args, **kw):
+                target = cache.get(node.__class__) or resolve(node.__class__)
+                if args or kw:
+                    return target(obj, node, *args, **kw)
+                return target(obj, node)
+        dispatch.dispatcher = self
+        dispatch.__name__ = dispatch.__qualname__ = self.default.__name__
+        dispatch.__doc__ = self.default.__doc__
+        return dispatch
+
+    def __build_single(self):
+        # fastest path: exactly the dispatched argument (and self for methods), nothing else
+        cache, resolve = self.cache, self.resolve
+
+        if self.param_index == 0:
+            def single(node):
+                return (cache.get(node.__class__) or resolve(node.__class__))(node)
+        elif self.param_index != 1:
+            return self.function
+        else:
+            def single(obj, node):
+                return (cache.get(node.__class__) or resolve(node.__class__))(obj, node)
+        single.dispatcher = self
+        return single
 
     @staticmethod
     def __argspec(fn):
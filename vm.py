@@ -0,0 +1,167 @@
+from memory import FrameStack
+from matrix import Matrix
+from interpreter import operations, mat_operations, mat_functions, mat_unary_operations, fused_expr, RETURN
+from bytecode import (Bytecode, SLOT_BITS, SLOT_MASK, HALT, CONST, LOAD, STORE, STORE_RAW, DUP, POP, INDEX,
+                      STORE_INDEX, SLICE, BINARY, COMPOUND, FUSED, NEG, TRANSPOSE, VECTOR, CALL, PRINT, PRINT_END,
+                      RETURN_VALUE, JUMP, JUMP_IF_FALSE, JUMP_IF_NOT_NONE, FOR_RANGE, FOR_ITER, PUSH_FRAME, POP_FRAME,
+                      CLEAR_HOISTED, SET_SLICES, JUMP_IF_EMPTY, STORE_LAST)
+
+
+class VM(object):
+    """Runs Bytecode with the semantics of the tree-walking Interpreter.
+
+    One loop fetches an opcode and its operand and branches on the opcode,
+    the most frequent ones first. Values live on a list used as the operand
+    stack, variables in the FrameStack, whose frames the bytecode pushes and
+    pops itself. Matrix operations go through the backend tables, so they
+    are the Interpreter's.
+    """
+
+    def __init__(self):
+        self.memory = FrameStack()
+        self.return_value = None
+
+
+    def run(self, code: Bytecode):
+        self.memory = FrameStack(code.frame_size)
+        if self.execute(code) == RETURN:
+            print(f'Program exited with value {self.return_value}')
+
+
+    def execute(self, code: Bytecode):
+        """Runs code on the current memory, returning RETURN if it returned, else None."""
+        ops, args, consts = code.ops, code.args, code.consts
+        frames = self.memory.frames
+        base = len(frames)
+        stack = []
+        push, pop = stack.append, stack.pop
+        pc = 0
+
+        try:
+            while True:
+                op = ops[pc]
+                arg = args[pc]
+                pc += 1
+
+                if op == LOAD:
+                    push(frames[arg >> SLOT_BITS][arg & SLOT_MASK])
+                elif op == CONST:
+                    push(consts[arg])
+                elif op == BINARY:
+                    right = pop()
+                    left = pop()
+                    if isinstance(left, Matrix) or isinstance(right, Matrix):
+                        push(mat_operations[consts[arg]](left, right))
+                    else:
+                        push(operations[consts[arg]](left, right))
+                elif op == JUMP_IF_FALSE:
+                    if not pop():
+                        pc = arg
+                elif op == JUMP:
+                    pc = arg
+                elif op == STORE:
+                    value = pop()
+                    if isinstance(value, Matrix):
+                        # the value may be another variable's matrix, they only share it until one is written
+                        value = value.share()
+                    frames[arg >> SLOT_BITS][arg & SLOT_MASK] = value
+                elif op == FOR_ITER:
+                    value = next(stack[-1], None)
+                    if value is None:
+                        pop()
+                        pc = arg
+                    else:
+                        push(value)
+                elif op == STORE_RAW:
+                    frames[arg >> SLOT_BITS][arg & SLOT_MASK] = pop()
+                elif op == COMPOUND:
+                    old = pop()
+                    value = pop()
+                    if isinstance(old, Matrix):
+                        push(mat_operations[consts[arg]](old, value))
+                    else:
+                        push(operations[consts[arg]](old, value))
+                elif op == INDEX:
+                    index = tuple(stack[len(stack) - arg:])
+                    del stack[len(stack) - arg:]
+                    push(pop()[index])
+                elif op == STORE_INDEX:
+                    index = tuple(stack[len(stack) - arg:])
+                    del stack[len(stack) - arg:]
+                    matrix = pop()
+                    matrix[index] = pop()
+                elif op == SLICE:
+                    end = pop()
+                    push(slice(pop(), end))
+                elif op == NEG:
+                    push(-pop())
+                elif op == PUSH_FRAME:
+                    frames.append([None] * arg)
+                elif op == POP_FRAME:
+                    frames.pop()
+                elif op == DUP:
+                    push(stack[-1])
+                elif op == POP:
+                    pop()
+                elif op == JUMP_IF_NOT_NONE:
+                    if stack[-1] is not None:
+                        pc = arg
+                    else:
+                        pop()
+                elif op == FOR_RANGE:
+                    bounds = pop()
+                    push(iter(range(bounds.start, bounds.stop + 1)))
+                elif op == CLEAR_HOISTED:
+                    # values hoisted out of a loop are computed again, on first use, each time it starts
+                    for slot in consts[arg]:
+                        frames[0][slot] = None
+                elif op == FUSED:
+                    fused, count = consts[arg]
+                    operands = stack[len(stack) - count:]
+                    del stack[len(stack) - count:]
+                    push(fused_expr(fused, operands))
+                elif op == TRANSPOSE:
+                    push(mat_unary_operations['TRANSPOSE'](pop()))
+                elif op == VECTOR:
+                    count, elements_type = consts[arg]
+                    values = stack[len(stack) - count:]
+                    del stack[len(stack) - count:]
+                    push(Matrix.from_values(values, elements_type))
+                elif op == CALL:
+                    name, count = consts[arg]
+                    values = stack[len(stack) - count:]
+                    del stack[len(stack) - count:]
+                    push(mat_functions[name](*values))
+                elif op == PRINT:
+                    value = pop()
+                    if isinstance(value, Matrix) and len(value.shape) == 2:
+                        print('\n[\n  ', end='')
+                        print(*value.tolist(), sep='\n  ')
+                        print(']')
+                    else:
+                        print(value, end=' ')
+                elif op == PRINT_END:
+                    print('')
+                elif op == JUMP_IF_EMPTY:
+                    # like the loops, an empty range runs nothing
+                    if stack[-1].start > stack[-1].stop:
+                        pop()
+                        pc = arg
+                elif op == SET_SLICES:
+                    loop_variables = consts[arg]
+                    ranges = stack[len(stack) - len(loop_variables):]
+                    for loop_variable, bounds in zip(loop_variables, ranges):
+                        frames[loop_variable >> SLOT_BITS][loop_variable & SLOT_MASK] = \
+                            slice(bounds.start, bounds.stop + 1)
+                elif op == STORE_LAST:
+                    frames[arg >> SLOT_BITS][arg & SLOT_MASK] = pop().stop
+                elif op == RETURN_VALUE:
+                    self.return_value = pop()
+                    return RETURN
+                elif op == HALT:
+                    return None
+                else:
+                    raise RuntimeError(f'Unknown bytecode instruction {op} at {pc - 1}')
+        finally:
+            # frames a return, or an error, left pushed
+            del frames[base:]